@@ -3,3 +3,4 @@
 from .queue_manager import AudioQueue
 from .player import AudioPlayer
 from .track_info import TrackInfo
+from .guild_state import GuildState
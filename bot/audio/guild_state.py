@@ -0,0 +1,25 @@
+"""
+ギルド状態管理
+
+ギルドごとの再生状態をまとめて格納するクラス
+"""
+
+import sys
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, List, Optional
+from .track_info import TrackInfo
+
+_DATACLASS_OPTIONS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+@dataclass(**_DATACLASS_OPTIONS)
+class GuildState:
+    """ギルドごとの再生状態を格納するデータクラス"""
+    queue: Deque[TrackInfo] = field(default_factory=deque)
+    now_playing: Optional[TrackInfo] = None
+    loop_enabled: bool = False
+    text_channel_id: Optional[int] = None
+    text_channel_verified: bool = False  # text_channel_idへの送信権限を確認済みか
+    pending_requests: List[TrackInfo] = field(default_factory=list)
+    is_starting_playback: bool = False
+    queue_text: Optional[str] = None  # /queue表示用に整形済みのキュー（変更時に破棄）
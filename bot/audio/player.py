@@ -7,22 +7,70 @@ Discord音声チャンネルでの音声再生機能
 import asyncio
 import discord
 import logging
-import threading
+import subprocess
+from discord.oggparse import OggStream
 from pathlib import Path
 from typing import Optional, Callable
 
-from ..utils.file_utils import cleanup_audio_file, validate_audio_file, get_latest_audio_file, protect_file, unprotect_file
+from ..utils.file_utils import cleanup_audio_file, validate_audio_file, protect_file, unprotect_file, register_ffmpeg_process
+from ..utils.audio_cache import is_cached_audio
 from .track_info import TrackInfo
 
 logger = logging.getLogger(__name__)
 
+# FFmpegの共通オプション
+# （ローカルのOpusファイルは形式が決まっているため、入力の解析を最小限にして再生開始を早める）
+FFMPEG_BEFORE_OPTIONS = '-nostdin -loglevel error -hide_banner -probesize 32k -analyzeduration 0'
+FFMPEG_STREAM_BEFORE_OPTIONS = (
+    '-nostdin -loglevel error -hide_banner '
+    '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5'
+)
+FFMPEG_BITRATE = 128
+
+def _log_callback_error(future):
+    """再生終了コールバックで発生した例外をログに記録"""
+    if future.cancelled():
+        return
+    error = future.exception()
+    if error:
+        logger.error(f"Error in playback callback: {error}")
+
+class OggOpusFileAudio(discord.AudioSource):
+    """
+    Ogg Opusファイルのパケットをそのまま送る音声ソース
+    
+    FFmpegプロセスを起動せずに、ファイルから読み出したOpusフレームを直接Discordへ送る
+    """
+    
+    def __init__(self, file_path: str):
+        self._file = open(file_path, 'rb')
+        self._packet_iter = OggStream(self._file).iter_packets()
+    
+    def read(self) -> bytes:
+        return next(self._packet_iter, b'')
+    
+    def is_opus(self) -> bool:
+        return True
+    
+    def cleanup(self):
+        self._file.close()
+
 class AudioPlayer:
     """音声再生を管理するクラス"""
     
-    def __init__(self, download_dir: str):
+    def __init__(self, download_dir: str, volume: float = 0.25):
         self.download_dir = download_dir
+        self.volume = volume  # FFmpegのvolumeフィルタで適用する音量
+        self._ffmpeg_options = self._build_ffmpeg_options(volume)
         self.current_audio_files = {}  # guild_id -> file_path
     
+    @staticmethod
+    def _build_ffmpeg_options(volume: float) -> str:
+        """FFmpegの出力オプションを生成（音量はvolumeフィルタで適用する）"""
+        if volume != 1.0:
+            return f'-vn -af volume={volume}'
+        return '-vn'
+    
     async def play_track(self, 
                         guild_id: int, 
                         track_info: TrackInfo, 
@@ -39,15 +87,25 @@ class AudioPlayer:
             on_finish_callback: 再生終了時のコールバック
         """
         try:
-            # 音声ファイルを取得
-            file_path = track_info.file_path or get_latest_audio_file(self.download_dir)
+            # 音声ファイルを取得（ダウンロード時に確定したパスを使用）
+            file_path = track_info.file_path
             
-            if not file_path or not validate_audio_file(file_path):
-                logger.error(f"Invalid audio file for track: {track_info.title}")
+            if file_path:
+                # ファイル確認はイベントループを塞がないようにスレッドプールで実行
+                is_valid = await asyncio.get_running_loop().run_in_executor(
+                    None, validate_audio_file, file_path
+                )
+                if not is_valid:
+                    logger.error(f"Invalid audio file for track: {track_info.title}")
+                    return False
+                logger.info(f"Playing track: {track_info.title} ({file_path})")
+            elif track_info.stream_url:
+                # ダウンロード済みファイルがない場合はストリーミング再生
+                logger.info(f"Streaming track: {track_info.title}")
+            else:
+                logger.error(f"No audio file or stream for track: {track_info.title}")
                 return False
             
-            logger.info(f"Playing track: {track_info.title} ({file_path})")
-            
             # 音声を再生
             success = await self._start_playback(
                 guild_id, file_path, track_info, voice_client, on_finish_callback, is_loop
@@ -66,18 +124,28 @@ class AudioPlayer:
                              voice_client, 
                              on_finish_callback: Optional[Callable] = None,
                              is_loop: bool = False):
-        """音声再生を開始"""
+        """音声再生を開始（file_pathがNoneの場合はtrack_info.stream_urlをストリーミング再生）"""
+        audio_source = None
         try:
-            # FFmpegオプションを設定
-            ffmpeg_options = {
-                'options': '-vn',
-                'before_options': '-y -nostdin -loglevel error -hide_banner -re'
-            }
+            # 音声ソースはファイルやFFmpegプロセスを開くため、再生できることを確認してから作成する
+            if not voice_client or not voice_client.is_connected():
+                logger.error("Voice client not connected")
+                return False
+            
+            # 既に再生中の場合はエラーを返す
+            if voice_client.is_playing():
+                logger.warning(f"Already playing audio for guild {guild_id}, cannot start new track: {track_info.title}")
+                return False
             
             # 音声ソースを作成
-            audio_source = discord.FFmpegPCMAudio(file_path, **ffmpeg_options)
-            audio_source = discord.PCMVolumeTransformer(audio_source)
-            audio_source.volume = 0.25
+            if file_path:
+                audio_source = self._create_audio_source(file_path)
+            else:
+                audio_source = self._create_stream_source(track_info.stream_url)
+            
+            # 再生終了時のコールバックはdiscord.pyの音声スレッドから呼ばれるため、
+            # イベントループを保持しておきスレッドセーフに処理を依頼する
+            loop = asyncio.get_running_loop()
             
             # 再生終了時のコールバックを設定
             def after_playing(error):
@@ -86,94 +154,116 @@ class AudioPlayer:
                 else:
                     logger.info(f"Track playback finished successfully: {track_info.title}")
                 
-                logger.info(f"🔄 After playing callback - is_loop={is_loop}, file_path={file_path}, guild={guild_id}")
+                logger.debug("🔄 After playing callback - is_loop=%s, file_path=%s, guild=%s", is_loop, file_path, guild_id)
                 
-                # ループ時はファイルを削除しない（再利用のため）
+                # ループでない場合のみ、現在の音声ファイル記録を削除
                 if not is_loop:
-                    unprotect_file(file_path)  # 保護を解除してから削除
-                    cleanup_audio_file(file_path, guild_id)
-                    logger.info(f"🗑️ Cleaned up audio file (non-loop): {file_path}")
-                else:
-                    logger.info(f"🔁 Keeping audio file for loop: {file_path}")
+                    self.current_audio_files.pop(guild_id, None)
                 
-                # ループでない場合のみ、現在の音声ファイル記録を削除
-                if not is_loop and guild_id in self.current_audio_files:
-                    del self.current_audio_files[guild_id]
+                if loop.is_closed():
+                    logger.warning(f"Event loop closed, skipping after-playing work for guild {guild_id}")
+                    return
+                
+                # ループ時はファイルを削除しない（再利用のため）
+                if not file_path:
+                    pass  # ストリーミング再生では削除するファイルがない
+                elif not is_loop:
+                    # ファイル削除は音声スレッドを塞がないようにスレッドプールで実行
+                    loop.call_soon_threadsafe(
+                        loop.run_in_executor, None, self._release_audio_file, file_path, guild_id
+                    )
+                    logger.debug("🗑️ Scheduled release of audio file (non-loop): %s", file_path)
+                else:
+                    logger.debug("🔁 Keeping audio file for loop: %s", file_path)
                 
-                # コールバックを実行
+                # コールバックをイベントループ上で実行
                 if on_finish_callback:
-                    # より安全な非同期コールバック実行
-                    def run_callback():
-                        try:
-                            # 非同期コールバックの場合
-                            if asyncio.iscoroutinefunction(on_finish_callback):
-                                # 既存のイベントループを取得または新規作成
-                                try:
-                                    # 現在のイベントループを取得
-                                    loop = asyncio.get_event_loop()
-                                    if loop.is_running():
-                                        # イベントループが実行中の場合、asyncio.run_coroutine_threadsafeを使用
-                                        future = asyncio.run_coroutine_threadsafe(
-                                            on_finish_callback(error, guild_id, track_info), loop
-                                        )
-                                        future.result(timeout=30)  # 30秒でタイムアウト
-                                    else:
-                                        # イベントループが停止中の場合、新しいループで実行
-                                        loop.run_until_complete(
-                                            on_finish_callback(error, guild_id, track_info)
-                                        )
-                                except RuntimeError:
-                                    # イベントループが存在しない場合、新しいループを作成
-                                    try:
-                                        new_loop = asyncio.new_event_loop()
-                                        asyncio.set_event_loop(new_loop)
-                                        new_loop.run_until_complete(
-                                            on_finish_callback(error, guild_id, track_info)
-                                        )
-                                    finally:
-                                        try:
-                                            new_loop.close()
-                                            asyncio.set_event_loop(None)
-                                        except Exception:
-                                            pass
-                                except Exception as async_error:
-                                    logger.error(f"Error in async callback: {async_error}")
-                            else:
-                                # 同期コールバックの場合
-                                on_finish_callback(error, guild_id, track_info)
-                        except Exception as cb_error:
-                            logger.error(f"Error in playback callback: {cb_error}")
-                    
-                    # 別スレッドでコールバックを実行
-                    callback_thread = threading.Thread(target=run_callback, daemon=True)
-                    callback_thread.start()
+                    try:
+                        if asyncio.iscoroutinefunction(on_finish_callback):
+                            future = asyncio.run_coroutine_threadsafe(
+                                on_finish_callback(error, guild_id, track_info), loop
+                            )
+                            future.add_done_callback(_log_callback_error)
+                        else:
+                            loop.call_soon_threadsafe(on_finish_callback, error, guild_id, track_info)
+                    except Exception as cb_error:
+                        logger.error(f"Error scheduling playback callback: {cb_error}")
             
-            # 再生開始
-            if voice_client and voice_client.is_connected():
-                # 既に再生中の場合はエラーを返す
-                if voice_client.is_playing():
-                    logger.warning(f"Already playing audio for guild {guild_id}, cannot start new track: {track_info.title}")
-                    return False
-                
-                voice_client.play(audio_source, after=after_playing)
+            # 再生開始（以降の音声ソースの後始末はdiscord.pyが行う）
+            ffmpeg_process = getattr(audio_source, '_process', None)
+            voice_client.play(audio_source, after=after_playing)
+            audio_source = None
+            # 終了処理で対象を絞れるようにFFmpegプロセスを登録
+            register_ffmpeg_process(guild_id, ffmpeg_process)
+            if file_path:
                 self.current_audio_files[guild_id] = file_path
-                
-                # ループの場合はファイルを保護
-                if is_loop:
-                    protect_file(file_path)
-                    logger.info(f"🔒 Protected loop file: {file_path}")
-                
-                logger.info(f"Started playing track: {track_info.title}")
-                return True
-            else:
-                logger.error("Voice client not connected")
-                return False
+            
+            # ループの場合はファイルを保護
+            if is_loop and file_path:
+                protect_file(file_path)
+                logger.debug("🔒 Protected loop file: %s", file_path)
+            
+            logger.info(f"Started playing track: {track_info.title}")
+            return True
                 
         except Exception as e:
             logger.error(f"Failed to start playback: {e}")
-            cleanup_audio_file(file_path, guild_id)
+            # 再生に渡せなかった音声ソースのファイルハンドル・FFmpegプロセスを解放
+            if audio_source is not None:
+                audio_source.cleanup()
+            if file_path:
+                self._schedule_release(file_path, guild_id)
             return False
     
+    def _create_audio_source(self, file_path: str):
+        """
+        Opus音声ソースを作成
+        
+        音量変更が不要なOpusファイルはFFmpegを介さずにそのまま送る。
+        それ以外はFFmpegOpusAudioでFFmpeg側にOpusフレームまで生成させるため、
+        Python側でのPCM処理とOpusエンコードは不要
+        """
+        if self.volume == 1.0 and file_path.endswith('.opus'):
+            return OggOpusFileAudio(file_path)
+        
+        return discord.FFmpegOpusAudio(
+            file_path,
+            bitrate=FFMPEG_BITRATE,
+            before_options=FFMPEG_BEFORE_OPTIONS,
+            options=self._ffmpeg_options
+        )
+    
+    def _create_stream_source(self, stream_url: str):
+        """
+        ストリーミング再生用の音声ソースを作成
+        
+        ダウンロード完了を待たずに、FFmpegで配信URLを直接読み込む
+        """
+        return discord.FFmpegOpusAudio(
+            stream_url,
+            bitrate=FFMPEG_BITRATE,
+            before_options=FFMPEG_STREAM_BEFORE_OPTIONS,
+            options=self._ffmpeg_options
+        )
+    
+    def _release_audio_file(self, file_path: str, guild_id: int, force_delete: bool = False):
+        """再生を終えた音声ファイルの保護を解除し、キャッシュ以外のファイルを削除"""
+        unprotect_file(file_path)
+        if is_cached_audio(file_path):
+            # キャッシュファイルは再利用のため残す（容量上限で古い順に削除される）
+            logger.debug("Keeping cached audio file: %s", file_path)
+            return
+        cleanup_audio_file(file_path, guild_id, force_delete=force_delete)
+    
+    def _schedule_release(self, file_path: str, guild_id: int, force_delete: bool = False):
+        """ファイルの解放をスレッドプールで実行（イベントループ外から呼ばれた場合はその場で実行）"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._release_audio_file(file_path, guild_id, force_delete)
+            return
+        loop.run_in_executor(None, self._release_audio_file, file_path, guild_id, force_delete)
+    
     def stop_playback(self, guild_id: int, voice_client):
         """再生を停止"""
         try:
@@ -182,11 +272,9 @@ class AudioPlayer:
                 logger.info(f"Stopped playback for guild {guild_id}")
             
             # 現在の音声ファイルをクリーンアップ（ループファイルも含む）
-            if guild_id in self.current_audio_files:
-                file_path = self.current_audio_files[guild_id]
-                unprotect_file(file_path)  # 保護を解除
-                cleanup_audio_file(file_path, guild_id, force_delete=True)  # 強制削除
-                del self.current_audio_files[guild_id]
+            file_path = self.current_audio_files.pop(guild_id, None)
+            if file_path:
+                self._schedule_release(file_path, guild_id, force_delete=True)  # 強制削除
                 logger.info(f"Cleaned up audio file on stop: {file_path}")
             
             return True
@@ -195,6 +283,19 @@ class AudioPlayer:
             logger.error(f"Failed to stop playback for guild {guild_id}: {e}")
             return False
     
+    async def stop_playback_and_wait(self, guild_id: int, voice_client, timeout: float = 5.0):
+        """再生を停止し、FFmpegプロセスが終了するまで待つ（切断前に使用）"""
+        process = getattr(voice_client.source, '_process', None) if voice_client else None
+        result = self.stop_playback(guild_id, voice_client)
+        
+        if process is not None:
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, process.wait, timeout)
+            except subprocess.TimeoutExpired:
+                logger.warning(f"FFmpeg process did not exit within {timeout}s for guild {guild_id}")
+        
+        return result
+    
     def pause_playback(self, voice_client):
         """再生を一時停止"""
         try:
@@ -234,11 +335,9 @@ class AudioPlayer:
     def cleanup_loop_file(self, guild_id: int):
         """ループ終了時にファイルをクリーンアップ"""
         try:
-            if guild_id in self.current_audio_files:
-                file_path = self.current_audio_files[guild_id]
-                unprotect_file(file_path)  # 保護を解除
-                cleanup_audio_file(file_path, guild_id, force_delete=True)  # 強制削除
-                del self.current_audio_files[guild_id]
+            file_path = self.current_audio_files.pop(guild_id, None)
+            if file_path:
+                self._schedule_release(file_path, guild_id, force_delete=True)  # 強制削除
                 logger.info(f"Cleaned up loop file: {file_path}")
                 return True
             return False
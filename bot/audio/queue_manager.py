@@ -6,27 +6,37 @@
 
 import asyncio
 import logging
-import threading
+import random
+import time
+from concurrent.futures import Future
+from itertools import islice
 from typing import Dict, List, Optional, Callable
+
+import discord
+
+from ..youtube import YouTubeDownloader, download_executor
 from .track_info import TrackInfo
+from .guild_state import GuildState
 
 logger = logging.getLogger(__name__)
 
+# Embedの色（呼び出しごとにColorを生成しないよう事前に作成）
+_ORANGE = discord.Color.orange()
+
 class AudioQueue:
     """音声キューを管理するクラス"""
     
-    def __init__(self):
-        self.queues: Dict[int, List[TrackInfo]] = {}  # guild_id -> queue
-        self.now_playing: Dict[int, TrackInfo] = {}  # guild_id -> current_track
-        self.downloaded_tracks: Dict[str, bool] = {}  # download_key -> status
+    def __init__(self, max_queue_size: int):
+        self.max_queue_size = max_queue_size  # ギルドごとのキューに追加できる最大曲数（設定のMAX_QUEUE_SIZE）
         
-        # ループ機能
-        self.loop_enabled: Dict[int, bool] = {}  # guild_id -> loop_status
+        # キュー・再生中トラック・ループ・通知先・保留リクエストはギルド単位でまとめて保持
+        self.guild_states: Dict[int, GuildState] = {}  # guild_id -> state
+        self.downloaded_tracks: Dict[str, bool] = {}  # download_key -> status
         
         # 事前ダウンロード機能
         self.preload_tracks: Dict[str, TrackInfo] = {}  # download_key -> track_info
         self.download_status: Dict[str, str] = {}  # download_key -> status (pending/downloading/completed/failed)
-        self.download_threads: Dict[str, threading.Thread] = {}  # download_key -> thread
+        self.download_futures: Dict[str, Future] = {}  # download_key -> future
         self.max_preload_tracks = 3  # 最大事前ダウンロード数（パフォーマンス向上）
         self.download_callback: Optional[Callable] = None  # ダウンロード完了コールバック
         
@@ -34,42 +44,62 @@ class AudioQueue:
         self.idle_timeout_tasks: Dict[int, asyncio.Task] = {}  # guild_id -> timeout_task
         self.idle_timeout_duration = 300  # 5分間（秒）
         
-        # テキストチャンネル情報（通知用）
-        self.text_channels: Dict[int, int] = {}  # guild_id -> text_channel_id
-        
         # 同時再生リクエスト管理
-        self.pending_requests: Dict[int, List[TrackInfo]] = {}  # guild_id -> pending_tracks
         self.playback_locks: Dict[int, asyncio.Lock] = {}  # guild_id -> lock
-        self.is_starting_playback: Dict[int, bool] = {}  # guild_id -> bool
         
         # タスク管理
         self.active_tasks: Dict[str, asyncio.Task] = {}  # task_id -> task
     
-    def add_track(self, guild_id: int, track_info: TrackInfo):
-        """キューにトラックを追加"""
-        if guild_id not in self.queues:
-            self.queues[guild_id] = []
+    def _get_state(self, guild_id: int) -> GuildState:
+        """ギルドの状態を取得（存在しない場合は作成）"""
+        state = self.guild_states.get(guild_id)
+        if state is None:
+            state = self.guild_states[guild_id] = GuildState()
+        return state
+    
+    def add_track(self, guild_id: int, track_info: TrackInfo) -> bool:
+        """
+        キューにトラックを追加
         
+        Returns:
+            bool: 追加できた場合True（キューが満杯の場合はFalse）
+        """
         # 辞書形式のtrack_infoの場合はTrackInfoオブジェクトに変換
         if isinstance(track_info, dict):
             track_info = TrackInfo.from_dict(track_info)
         
-        self.queues[guild_id].append(track_info)
+        state = self._get_state(guild_id)
+        if len(state.queue) >= self.max_queue_size:
+            logger.warning(f"Queue is full for guild {guild_id}, dropping track: {track_info.title}")
+            return False
+        
+        state.queue.append(track_info)
+        state.queue_text = None
         
         # 新しい曲が追加されたのでアイドルタイムアウトをキャンセル
         self.cancel_idle_timeout(guild_id)
         
         logger.info(f"Added track to queue for guild {guild_id}: {track_info.title}")
+        return True
+    
+    def is_queue_full(self, guild_id: int) -> bool:
+        """キューが最大曲数に達しているかどうかを確認"""
+        return self.get_queue_length(guild_id) >= self.max_queue_size
     
     def get_next_track(self, guild_id: int) -> Optional[TrackInfo]:
         """次のトラックを取得"""
         # ループが有効で現在再生中の曲がある場合は、同じ曲を返す
-        if self.is_loop_enabled(guild_id) and guild_id in self.now_playing:
-            current_track = self.now_playing[guild_id]
+        state = self.guild_states.get(guild_id)
+        if state is None:
+            return None
+        
+        if state.loop_enabled:
+            current_track = state.now_playing
             if current_track:
                 logger.info(f"Loop track for guild {guild_id}: {current_track.title}")
                 # ループの場合は新しいTrackInfoオブジェクトを作成して返す
                 # （同じオブジェクトを再利用すると状態管理で問題が起きる可能性があるため）
+                # ストリームURLは数時間で期限切れになるため引き継がず、再生時に解決し直す
                 return TrackInfo(
                     url=current_track.url,
                     title=current_track.title,
@@ -79,60 +109,140 @@ class AudioQueue:
                 )
         
         # 通常の次の曲取得
-        if guild_id in self.queues and self.queues[guild_id]:
-            track = self.queues[guild_id].pop(0)
+        if state.queue:
+            track = state.queue.popleft()
+            state.queue_text = None
             # ここでnow_playingを更新するのは適切ではない
             # 実際の再生開始時に更新されるべき
             logger.info(f"Next track for guild {guild_id}: {track.title}")
             return track
         return None
     
-    def get_queue(self, guild_id: int) -> List[TrackInfo]:
-        """キューの内容を取得"""
-        if guild_id in self.queues:
-            return self.queues[guild_id].copy()
-        return []
+    def get_queue(self, guild_id: int, limit: Optional[int] = None) -> List[TrackInfo]:
+        """キューの内容を取得（limitを指定した場合は先頭から指定数のみ）"""
+        state = self.guild_states.get(guild_id)
+        if not state:
+            return []
+        if limit is not None:
+            return list(islice(state.queue, limit))
+        return list(state.queue)
+    
+    def get_queue_text(self, guild_id: int, limit: int = 10) -> str:
+        """
+        /queue表示用に整形したキューの内容を取得
+        
+        整形結果はキューが変更されるまで再利用する
+        
+        Args:
+            guild_id: ギルドID
+            limit: 表示する最大曲数
+        
+        Returns:
+            str: 整形済みのキュー（キューが空の場合は空文字）
+        """
+        state = self.guild_states.get(guild_id)
+        if not state or not state.queue:
+            return ""
+        
+        if state.queue_text is None:
+            lines = [
+                f"{i}. **{track.title}**\n   追加者: {track.user}\n"
+                for i, track in enumerate(islice(state.queue, limit), 1)
+            ]
+            queue_length = len(state.queue)
+            if queue_length > limit:
+                lines.append(f"\n... 他 {queue_length - limit} 曲")
+            state.queue_text = "".join(lines)
+        return state.queue_text
+    
+    def invalidate_queue_text(self, guild_id: int):
+        """整形済みのキュー表示を破棄（曲のタイトル更新時など）"""
+        state = self.guild_states.get(guild_id)
+        if state:
+            state.queue_text = None
+    
+    def peek_next_track(self, guild_id: int) -> Optional[TrackInfo]:
+        """キューの先頭の曲を取り出さずに取得"""
+        state = self.guild_states.get(guild_id)
+        return state.queue[0] if state and state.queue else None
     
     def clear_queue(self, guild_id: int):
         """キューをクリア"""
-        if guild_id in self.queues:
-            self.queues[guild_id].clear()
+        state = self.guild_states.get(guild_id)
+        if state:
+            state.queue.clear()
+            state.queue_text = None
             logger.info(f"Cleared queue for guild {guild_id}")
     
+    def skip_tracks(self, guild_id: int, count: int) -> int:
+        """キューの先頭から指定数のトラックを取り除き、取り除いた数を返す"""
+        state = self.guild_states.get(guild_id)
+        if not state:
+            return 0
+        
+        skipped = min(count, len(state.queue))
+        for _ in range(skipped):
+            state.queue.popleft()
+        state.queue_text = None
+        
+        if skipped:
+            logger.info(f"Skipped {skipped} queued tracks for guild {guild_id}")
+        return skipped
+    
+    def shuffle_queue(self, guild_id: int) -> int:
+        """キューをシャッフルし、対象となった曲数を返す"""
+        state = self.guild_states.get(guild_id)
+        if not state or len(state.queue) < 2:
+            return 0
+        
+        tracks = list(state.queue)
+        random.shuffle(tracks)
+        state.queue.clear()
+        state.queue.extend(tracks)
+        state.queue_text = None
+        
+        logger.info(f"Shuffled queue for guild {guild_id}: {len(tracks)} tracks")
+        return len(tracks)
+    
     def get_queue_length(self, guild_id: int) -> int:
         """キューの長さを取得"""
-        if guild_id in self.queues:
-            return len(self.queues[guild_id])
-        return 0
+        state = self.guild_states.get(guild_id)
+        return len(state.queue) if state else 0
     
     def is_playing(self, guild_id: int) -> bool:
         """現在再生中かどうかを確認"""
-        return guild_id in self.now_playing and self.now_playing[guild_id] is not None
+        state = self.guild_states.get(guild_id)
+        return state is not None and state.now_playing is not None
     
     def get_now_playing(self, guild_id: int) -> Optional[TrackInfo]:
         """現在再生中のトラックを取得"""
-        return self.now_playing.get(guild_id)
+        state = self.guild_states.get(guild_id)
+        return state.now_playing if state else None
     
     def set_now_playing(self, guild_id: int, track_info: TrackInfo):
         """現在再生中のトラックを設定"""
-        self.now_playing[guild_id] = track_info
+        self._get_state(guild_id).now_playing = track_info
         logger.info(f"Set now playing for guild {guild_id}: {track_info.title}")
     
     def clear_now_playing(self, guild_id: int):
         """現在再生中のトラックをクリア"""
-        if guild_id in self.now_playing:
-            del self.now_playing[guild_id]
+        state = self.guild_states.get(guild_id)
+        if state and state.now_playing is not None:
+            state.now_playing = None
             logger.info(f"Cleared now playing for guild {guild_id}")
     
     def has_queue(self, guild_id: int) -> bool:
         """キューに曲があるかどうかを確認"""
-        return guild_id in self.queues and len(self.queues[guild_id]) > 0
+        state = self.guild_states.get(guild_id)
+        return state is not None and len(state.queue) > 0
     
     def set_download_status(self, guild_id: int, url: str, status: bool):
         """ダウンロード状況を記録"""
         download_key = f"{guild_id}_{url}"
         self.downloaded_tracks[download_key] = status
-        logger.debug(f"Set download status for {download_key}: {status}")
+        # ダウンロードでタイトルが更新されている可能性があるため表示を作り直す
+        self.invalidate_queue_text(guild_id)
+        logger.debug("Set download status for %s: %s", download_key, status)
     
     def get_download_status(self, guild_id: int, url: str) -> bool:
         """ダウンロード状況を取得"""
@@ -141,22 +251,10 @@ class AudioQueue:
     
     def remove_guild_data(self, guild_id: int):
         """ギルドのすべてのデータを削除"""
-        if guild_id in self.queues:
-            del self.queues[guild_id]
-        if guild_id in self.now_playing:
-            del self.now_playing[guild_id]
-        if guild_id in self.text_channels:
-            del self.text_channels[guild_id]
-        if guild_id in self.loop_enabled:
-            del self.loop_enabled[guild_id]
-        
-        # 新しい状態管理データも削除
-        if guild_id in self.pending_requests:
-            del self.pending_requests[guild_id]
-        if guild_id in self.playback_locks:
-            del self.playback_locks[guild_id]
-        if guild_id in self.is_starting_playback:
-            del self.is_starting_playback[guild_id]
+        # キュー・再生中トラック・ループ・通知先・保留リクエストを一括で削除
+        self.guild_states.pop(guild_id, None)
+        # 再生ロックは切断処理中も保持されているため削除しない
+        # （削除すると別のロックで/playが並行実行されてしまう）
         
         # アイドルタイムアウトもキャンセル
         self.cancel_idle_timeout(guild_id)
@@ -178,12 +276,57 @@ class AudioQueue:
     
     def set_text_channel(self, guild_id: int, channel_id: int):
         """ギルドのテキストチャンネルIDを設定"""
-        self.text_channels[guild_id] = channel_id
-        logger.debug(f"Set text channel for guild {guild_id}: {channel_id}")
+        state = self._get_state(guild_id)
+        if state.text_channel_id != channel_id:
+            state.text_channel_id = channel_id
+            state.text_channel_verified = False
+        logger.debug("Set text channel for guild %s: %s", guild_id, channel_id)
     
     def get_text_channel(self, guild_id: int) -> Optional[int]:
         """ギルドのテキストチャンネルIDを取得"""
-        return self.text_channels.get(guild_id)
+        state = self.guild_states.get(guild_id)
+        return state.text_channel_id if state else None
+    
+    def get_notification_channel(self, guild, channel_id: Optional[int] = None):
+        """
+        通知を送信できるテキストチャンネルを取得
+        
+        送信権限の確認結果はギルドごとに保持し、曲の切り替えごとに権限を再計算しない。
+        チャンネル・ロールの更新時はinvalidate_notification_channelで破棄する
+        
+        Args:
+            guild: ギルド
+            channel_id: 使用するチャンネルID（省略時は保存されているチャンネル）
+        
+        Returns:
+            送信可能なチャンネル、見つからないか権限がない場合はNone
+        """
+        state = self.guild_states.get(guild.id)
+        saved_channel_id = state.text_channel_id if state else None
+        channel_id = channel_id or saved_channel_id
+        if not channel_id:
+            return None
+        
+        channel = guild.get_channel(channel_id)
+        if not channel:
+            return None
+        
+        if state and state.text_channel_verified and channel_id == saved_channel_id:
+            return channel
+        
+        if not channel.permissions_for(guild.me).send_messages:
+            return None
+        
+        # 送信可能と確認できた場合のみ記録（権限不足は次回再確認する）
+        if state and channel_id == saved_channel_id:
+            state.text_channel_verified = True
+        return channel
+    
+    def invalidate_notification_channel(self, guild_id: int):
+        """通知チャンネルの送信権限の確認結果を破棄"""
+        state = self.guild_states.get(guild_id)
+        if state:
+            state.text_channel_verified = False
     
     def _get_download_key(self, guild_id: int, url: str) -> str:
         """ダウンロードキーを生成"""
@@ -192,12 +335,13 @@ class AudioQueue:
     def start_preload(self, guild_id: int):
         """事前ダウンロードを開始"""
         try:
-            if guild_id not in self.queues or not self.queues[guild_id]:
-                logger.debug(f"No tracks to preload for guild {guild_id}")
+            state = self.guild_states.get(guild_id)
+            if not state or not state.queue:
+                logger.debug("No tracks to preload for guild %s", guild_id)
                 return
             
             # 事前ダウンロード対象のトラックを取得
-            tracks_to_preload = self.queues[guild_id][:self.max_preload_tracks]
+            tracks_to_preload = list(islice(state.queue, self.max_preload_tracks))
             
             for track in tracks_to_preload:
                 download_key = self._get_download_key(guild_id, track.url)
@@ -206,7 +350,7 @@ class AudioQueue:
                 if download_key in self.download_status:
                     current_status = self.download_status[download_key]
                     if current_status in ['downloading', 'completed']:
-                        logger.debug(f"Track already {current_status}: {track.title}")
+                        logger.debug("Track already %s: %s", current_status, track.title)
                         continue
                 
                 # 事前ダウンロードを開始
@@ -223,7 +367,6 @@ class AudioQueue:
             download_key = self._get_download_key(guild_id, track.url)
             
             # YouTubeDownloaderクラスレベルでのダウンロード状況をチェック
-            from ..youtube import YouTubeDownloader
             global_status = YouTubeDownloader.get_download_status(track.url)
             
             if global_status in ['downloading', 'completed']:
@@ -231,8 +374,7 @@ class AudioQueue:
                 self.download_status[download_key] = global_status
                 if global_status == 'completed':
                     # 既に完了している場合は、ファイルパスを取得
-                    downloader = YouTubeDownloader()
-                    file_path = downloader.get_latest_mp3_file()
+                    file_path = YouTubeDownloader.get_downloaded_file(track.url)
                     if file_path:
                         track.file_path = file_path
                         self.preload_tracks[download_key] = track
@@ -242,66 +384,93 @@ class AudioQueue:
             self.download_status[download_key] = 'pending'
             self.preload_tracks[download_key] = track
             
+            # ギルドの状態はワーカースレッドから変更せず、イベントループ上で反映する
+            loop = asyncio.get_running_loop()
+            
+            def call_on_loop(callback, *args):
+                try:
+                    loop.call_soon_threadsafe(callback, *args)
+                except RuntimeError:
+                    # ボット終了後にダウンロードが終わった場合は結果を破棄する
+                    logger.debug("Event loop closed, dropping background download update: %s", track.title)
+            
             def download_worker():
+                result = (False, "Unknown Title", None)
                 try:
-                    logger.info(f"Starting background download: {track.title}")
-                    self.download_status[download_key] = 'downloading'
+                    call_on_loop(self._mark_background_download_started, download_key, track)
                     
-                    # YouTubeDownloaderを使用してダウンロード
+                    # 再生用音声をダウンロード（既に競合制御が実装済み）
                     downloader = YouTubeDownloader()
-                    
-                    # MP3をダウンロード（既に競合制御が実装済み）
-                    success, downloaded_title = downloader.download_mp3(track.url)
-                    
-                    if success:
-                        # ファイルパスを取得して保存
-                        file_path = downloader.get_latest_mp3_file()
-                        if file_path:
-                            track.file_path = file_path
-                            if downloaded_title and downloaded_title != "Unknown Title":
-                                track.title = downloaded_title
-                            
-                            self.download_status[download_key] = 'completed'
-                            logger.info(f"Background download completed: {track.title}")
-                            
-                            # コールバックを実行
-                            if self.download_callback:
-                                try:
-                                    self.download_callback(guild_id, track, True)
-                                except Exception as cb_error:
-                                    logger.error(f"Error in download callback: {cb_error}")
-                        else:
-                            self.download_status[download_key] = 'failed'
-                            logger.error(f"Background download failed: file not found for {track.title}")
-                    else:
-                        self.download_status[download_key] = 'failed'
-                        logger.error(f"Background download failed: {track.title}")
-                        
-                        # エラーコールバックを実行
-                        if self.download_callback:
-                            try:
-                                self.download_callback(guild_id, track, False)
-                            except Exception as cb_error:
-                                logger.error(f"Error in download error callback: {cb_error}")
-                
+                    result = downloader.download_audio(track.url)
                 except Exception as e:
-                    self.download_status[download_key] = 'failed'
                     logger.error(f"Background download worker error: {e}")
                 finally:
-                    # スレッド情報をクリーンアップ
-                    if download_key in self.download_threads:
-                        del self.download_threads[download_key]
+                    call_on_loop(self._finish_background_download, guild_id, download_key, track, result)
             
-            # バックグラウンドスレッドでダウンロード実行
-            download_thread = threading.Thread(target=download_worker, daemon=True)
-            self.download_threads[download_key] = download_thread
-            download_thread.start()
+            # ダウンロード専用のスレッドプールで実行（同時実行数は共通で制限される）
+            self.download_futures[download_key] = download_executor.submit(download_worker)
             
-            logger.debug(f"Background download thread started for: {track.title}")
+            logger.debug("Background download submitted for: %s", track.title)
             
         except Exception as e:
             logger.error(f"Failed to start background download: {e}")
     
+    def _mark_background_download_started(self, download_key: str, track: TrackInfo):
+        """事前ダウンロードの開始を記録（イベントループ上で実行）"""
+        if self.download_status.get(download_key) == 'pending':
+            self.download_status[download_key] = 'downloading'
+            logger.info(f"Starting background download: {track.title}")
+    
+    def _finish_background_download(self, guild_id: int, download_key: str, track: TrackInfo, result: tuple):
+        """
+        事前ダウンロードの結果を反映（イベントループ上で実行）
+        
+        Args:
+            guild_id: ギルドID
+            download_key: ダウンロードキー
+            track: ダウンロードしたトラック
+            result: download_audioの戻り値 (bool, str, str) - (成功可否, 動画タイトル, 出力ファイルパス)
+        """
+        # 実行情報をクリーンアップ
+        self.download_futures.pop(download_key, None)
+        
+        # ダウンロード中に切断などで破棄されたトラックには反映しない
+        if self.preload_tracks.get(download_key) is not track:
+            logger.debug("Discarding background download result for removed track: %s", track.title)
+            return
+        
+        success, downloaded_title, file_path = result
+        if success:
+            # ダウンロードで確定したファイルパスを保存
+            if file_path:
+                track.file_path = file_path
+                if downloaded_title and downloaded_title != "Unknown Title":
+                    track.title = downloaded_title
+                    self.invalidate_queue_text(guild_id)
+                
+                self.download_status[download_key] = 'completed'
+                logger.info(f"Background download completed: {track.title}")
+                
+                # コールバックを実行
+                if self.download_callback:
+                    try:
+                        self.download_callback(guild_id, track, True)
+                    except Exception as cb_error:
+                        logger.error(f"Error in download callback: {cb_error}")
+            else:
+                self.download_status[download_key] = 'failed'
+                logger.error(f"Background download failed: file not found for {track.title}")
+        else:
+            self.download_status[download_key] = 'failed'
+            logger.error(f"Background download failed: {track.title}")
+            
+            # エラーコールバックを実行
+            if self.download_callback:
+                try:
+                    self.download_callback(guild_id, track, False)
+                except Exception as cb_error:
+                    logger.error(f"Error in download error callback: {cb_error}")
+    
     def is_track_ready(self, guild_id: int, url: str) -> bool:
         """トラックがダウンロード済みかチェック"""
         download_key = self._get_download_key(guild_id, url)
@@ -326,18 +495,16 @@ class AudioQueue:
                     if status in ['completed', 'failed']:
                         keys_to_remove.append(download_key)
             
+            downloader = YouTubeDownloader()
             for key in keys_to_remove:
                 if key in self.download_status:
                     del self.download_status[key]
                 if key in self.preload_tracks:
                     # グローバルダウンロードステータスもクリーンアップ
                     track = self.preload_tracks[key]
-                    from ..youtube import YouTubeDownloader
-                    downloader = YouTubeDownloader()
                     downloader.cleanup_download_status(track.url)
                     del self.preload_tracks[key]
-                if key in self.download_threads:
-                    del self.download_threads[key]
+                self.download_futures.pop(key, None)
             
             if keys_to_remove:
                 logger.info(f"Cleaned up {len(keys_to_remove)} completed downloads for guild {guild_id}")
@@ -363,11 +530,12 @@ class AudioQueue:
             guild_prefix = f"{guild_id}_"
             cancelled_count = 0
             
-            # ダウンロード中のスレッドをキャンセル（注意：Pythonではスレッドの強制終了は推奨されない）
+            # 未開始のダウンロードはキャンセルし、実行中のものは結果を破棄する
+            # （注意：実行中のスレッドは強制終了できない）
             keys_to_remove = []
-            for download_key in list(self.download_threads.keys()):
+            for download_key, future in list(self.download_futures.items()):
                 if download_key.startswith(guild_prefix):
-                    # スレッドの状態を失敗に変更してクリーンアップ
+                    future.cancel()
                     self.download_status[download_key] = 'failed'
                     keys_to_remove.append(download_key)
                     cancelled_count += 1
@@ -378,8 +546,7 @@ class AudioQueue:
                     del self.download_status[key]
                 if key in self.preload_tracks:
                     del self.preload_tracks[key]
-                if key in self.download_threads:
-                    del self.download_threads[key]
+                self.download_futures.pop(key, None)
             
             if cancelled_count > 0:
                 logger.info(f"Cancelled {cancelled_count} downloads for guild {guild_id}")
@@ -402,51 +569,43 @@ class AudioQueue:
     def start_idle_timeout(self, guild_id: int, voice_client):
         """アイドルタイムアウトを開始"""
         try:
-            # 既存のタイムアウトタスクをキャンセル
-            self.cancel_idle_timeout(guild_id)
+            # 既にタイムアウト待機中の場合は新しいタスクを作らない
+            # （アイドル状態は最初の待機開始時点から続いているため、そのまま使う）
+            if self.is_idle_timeout_active(guild_id):
+                logger.debug("Idle timeout already pending for guild %s", guild_id)
+                return
             
             async def timeout_task():
                 try:
                     logger.info(f"Starting idle timeout for guild {guild_id} ({self.idle_timeout_duration} seconds)")
                     await asyncio.sleep(self.idle_timeout_duration)
                     
-                    # タイムアウト後、キューが空で再生中でない場合は切断
-                    if not self.has_queue(guild_id) and not self.is_playing(guild_id):
-                        if voice_client and voice_client.is_connected():
-                            logger.info(f"Idle timeout reached for guild {guild_id}, disconnecting...")
-                            
-                            # 切断通知を送信
-                            await self._send_disconnect_notification(guild_id, voice_client)
-                            
-                            # ボイスチャンネルから切断
-                            await voice_client.disconnect()
-                            
-                            # ギルドデータをクリーンアップ
-                            self.remove_guild_data(guild_id)
-                            
-                            # 事前ダウンロードもキャンセル
-                            self.cancel_downloads(guild_id)
-                    
-                    # タスクを削除
-                    if guild_id in self.idle_timeout_tasks:
-                        del self.idle_timeout_tasks[guild_id]
-                    
-                    # タスク管理システムからも削除
-                    task_id = f"guild_{guild_id}_idle_timeout"
-                    if task_id in self.active_tasks:
-                        del self.active_tasks[task_id]
+                    # /playによる再接続と競合しないよう、再生ロックを取得してから切断する
+                    playback_lock = await self.get_playback_lock(guild_id)
+                    async with playback_lock:
+                        # ここから先はキャンセルさせない（自分自身をキャンセルしないよう登録を解除）
+                        self._forget_idle_timeout_task(guild_id)
+                        
+                        # タイムアウト後、キューが空で再生中でない場合は切断
+                        if not self.has_queue(guild_id) and not self.is_playing(guild_id):
+                            if voice_client and voice_client.is_connected():
+                                logger.info(f"Idle timeout reached for guild {guild_id}, disconnecting...")
+                                
+                                # 切断通知を送信
+                                await self._send_disconnect_notification(guild_id, voice_client)
+                                
+                                # ボイスチャンネルから切断してギルドデータをクリーンアップ
+                                await self.disconnect_guild(guild_id, voice_client)
                         
                 except asyncio.CancelledError:
-                    logger.debug(f"Idle timeout cancelled for guild {guild_id}")
+                    logger.debug("Idle timeout cancelled for guild %s", guild_id)
                     # キャンセル時もクリーンアップ
-                    if guild_id in self.idle_timeout_tasks:
-                        del self.idle_timeout_tasks[guild_id]
+                    self._forget_idle_timeout_task(guild_id)
                     raise  # CancelledErrorは再発生させる
                 except Exception as e:
                     logger.error(f"Error in idle timeout task for guild {guild_id}: {e}")
                     # エラー時もタスクを削除
-                    if guild_id in self.idle_timeout_tasks:
-                        del self.idle_timeout_tasks[guild_id]
+                    self._forget_idle_timeout_task(guild_id)
             
             # タイムアウトタスクを開始
             task = asyncio.create_task(timeout_task())
@@ -466,7 +625,7 @@ class AudioQueue:
                 task = self.idle_timeout_tasks[guild_id]
                 task.cancel()
                 del self.idle_timeout_tasks[guild_id]
-                logger.debug(f"Cancelled idle timeout for guild {guild_id}")
+                logger.debug("Cancelled idle timeout for guild %s", guild_id)
                 
                 # タスク管理システムからもキャンセル
                 task_id = f"guild_{guild_id}_idle_timeout"
@@ -474,6 +633,27 @@ class AudioQueue:
         except Exception as e:
             logger.error(f"Failed to cancel idle timeout for guild {guild_id}: {e}")
     
+    def _forget_idle_timeout_task(self, guild_id: int):
+        """実行中のアイドルタイムアウトタスク自身の登録を解除"""
+        current_task = asyncio.current_task()
+        if self.idle_timeout_tasks.get(guild_id) is current_task:
+            del self.idle_timeout_tasks[guild_id]
+        task_id = f"guild_{guild_id}_idle_timeout"
+        if self.active_tasks.get(task_id) is current_task:
+            del self.active_tasks[task_id]
+    
+    async def disconnect_guild(self, guild_id: int, voice_client):
+        """ボイスチャンネルから切断し、ギルドの再生状態・タスク・事前ダウンロードを破棄"""
+        if voice_client and voice_client.is_connected():
+            await voice_client.disconnect()
+            logger.info(f"Disconnected from voice channel for guild {guild_id}")
+        
+        # キュー・再生中トラック・ループ・保留リクエストなどをまとめて削除
+        self.remove_guild_data(guild_id)
+        
+        # 事前ダウンロードもキャンセル
+        self.cancel_downloads(guild_id)
+    
     def is_idle_timeout_active(self, guild_id: int) -> bool:
         """アイドルタイムアウトが有効かどうかを確認"""
         return guild_id in self.idle_timeout_tasks and not self.idle_timeout_tasks[guild_id].done()
@@ -484,26 +664,20 @@ class AudioQueue:
             # 保存されているテキストチャンネルIDを取得
             text_channel_id = self.get_text_channel(guild_id)
             if not text_channel_id:
-                logger.debug(f"No text channel saved for guild {guild_id}, skipping notification")
+                logger.debug("No text channel saved for guild %s, skipping notification", guild_id)
                 return
             
-            # テキストチャンネルを取得
-            channel = voice_client.guild.get_channel(text_channel_id)
+            # 送信可能なテキストチャンネルを取得
+            channel = self.get_notification_channel(voice_client.guild, text_channel_id)
             if not channel:
-                logger.warning(f"Text channel {text_channel_id} not found for guild {guild_id}")
-                return
-            
-            # メッセージ送信権限をチェック
-            if not channel.permissions_for(voice_client.guild.me).send_messages:
-                logger.warning(f"No permission to send messages in channel {text_channel_id}")
+                logger.warning(f"Text channel {text_channel_id} not found or no permission for guild {guild_id}")
                 return
             
             # 切断通知の埋め込みメッセージを作成
-            import discord
             embed = discord.Embed(
                 title="💤 自動切断",
                 description="5分間アクティビティがなかったため、ボイスチャンネルから自動的に切断しました。",
-                color=discord.Color.orange()
+                color=_ORANGE
             )
             embed.add_field(
                 name="💡 ヒント",
@@ -519,21 +693,21 @@ class AudioQueue:
                     logger.info(f"Sent disconnect notification to channel {text_channel_id} for guild {guild_id}")
                 except asyncio.TimeoutError:
                     logger.warning(f"Timeout sending disconnect notification to channel {text_channel_id}")
-                except discord.HTTPException as e:
-                    logger.warning(f"HTTP error sending disconnect notification: {e}")
                 except discord.Forbidden:
+                    self.invalidate_notification_channel(guild_id)
                     logger.warning(f"No permission to send disconnect notification in channel {text_channel_id}")
+                except discord.HTTPException as e:
+                    logger.warning(f"HTTP error sending disconnect notification: {e}")
                 except Exception as e:
                     logger.error(f"Error sending disconnect notification: {e}")
             
             # バックグラウンドで通知を送信
-            import time
             task_id = f"guild_{guild_id}_disconnect_notification_{int(time.time() * 1000)}"
             task = asyncio.create_task(send_disconnect_notification())
             # 切断時は自分で管理する（selfが利用できない可能性があるため）
             def cleanup_notification_task(task):
                 try:
-                    logger.debug(f"Disconnect notification task completed: {task_id}")
+                    logger.debug("Disconnect notification task completed: %s", task_id)
                 except Exception:
                     pass
             task.add_done_callback(cleanup_notification_task)
@@ -543,20 +717,21 @@ class AudioQueue:
     
     def toggle_loop(self, guild_id: int) -> bool:
         """ループを切り替える"""
-        current_status = self.loop_enabled.get(guild_id, False)
-        new_status = not current_status
-        self.loop_enabled[guild_id] = new_status
+        state = self._get_state(guild_id)
+        new_status = not state.loop_enabled
+        state.loop_enabled = new_status
         logger.info(f"Loop toggled for guild {guild_id}: {new_status}")
         return new_status
     
     def set_loop(self, guild_id: int, enabled: bool):
         """ループの状態を設定"""
-        self.loop_enabled[guild_id] = enabled
+        self._get_state(guild_id).loop_enabled = enabled
         logger.info(f"Loop set for guild {guild_id}: {enabled}")
     
     def is_loop_enabled(self, guild_id: int) -> bool:
         """ループが有効かどうかを確認"""
-        return self.loop_enabled.get(guild_id, False)
+        state = self.guild_states.get(guild_id)
+        return state.loop_enabled if state else False
     
     async def get_playback_lock(self, guild_id: int) -> asyncio.Lock:
         """ギルドの再生ロックを取得"""
@@ -566,59 +741,72 @@ class AudioQueue:
     
     def add_pending_request(self, guild_id: int, track_info: TrackInfo):
         """同時再生リクエストを保留に追加"""
-        if guild_id not in self.pending_requests:
-            self.pending_requests[guild_id] = []
-        self.pending_requests[guild_id].append(track_info)
+        self._get_state(guild_id).pending_requests.append(track_info)
         logger.info(f"Added pending request for guild {guild_id}: {track_info.title}")
     
     def get_pending_requests(self, guild_id: int) -> List[TrackInfo]:
         """保留中のリクエストを取得"""
-        return self.pending_requests.get(guild_id, [])
+        state = self.guild_states.get(guild_id)
+        return state.pending_requests if state else []
     
     def clear_pending_requests(self, guild_id: int):
         """保留中のリクエストをクリア"""
-        if guild_id in self.pending_requests:
-            del self.pending_requests[guild_id]
+        state = self.guild_states.get(guild_id)
+        if state and state.pending_requests:
+            state.pending_requests = []
             logger.info(f"Cleared pending requests for guild {guild_id}")
     
-    def move_pending_to_queue(self, guild_id: int, exclude_track: 'TrackInfo' = None):
-        """保留中のリクエストをキューに移動（指定した曲は除く）"""
-        if guild_id in self.pending_requests:
-            pending = self.pending_requests[guild_id]
+    def move_pending_to_queue(self, guild_id: int, exclude_track: 'TrackInfo' = None) -> int:
+        """
+        保留中のリクエストをキューに移動（指定した曲は除く）
+        
+        Returns:
+            int: キューが満杯のため追加できずに破棄した曲数
+        """
+        dropped_count = 0
+        state = self.guild_states.get(guild_id)
+        if state:
+            pending = state.pending_requests
             if pending:
                 moved_count = 0
                 for track in pending:
                     # 勝者の曲は除外してキューに移動
                     if exclude_track is None or track.url != exclude_track.url:
-                        self.add_track(guild_id, track)
-                        moved_count += 1
+                        if self.add_track(guild_id, track):
+                            moved_count += 1
+                        else:
+                            dropped_count += 1
                 if moved_count > 0:
                     logger.info(f"Moved {moved_count} pending tracks to queue for guild {guild_id}")
+                if dropped_count > 0:
+                    logger.warning(f"Dropped {dropped_count} pending tracks for guild {guild_id}: queue is full")
                 self.clear_pending_requests(guild_id)
+        return dropped_count
     
     def is_starting_playback_active(self, guild_id: int) -> bool:
         """再生開始処理中かどうかを確認"""
-        return self.is_starting_playback.get(guild_id, False)
+        state = self.guild_states.get(guild_id)
+        return state.is_starting_playback if state else False
     
     def set_starting_playback(self, guild_id: int, is_starting: bool):
         """再生開始処理の状態を設定"""
-        self.is_starting_playback[guild_id] = is_starting
+        self._get_state(guild_id).is_starting_playback = is_starting
         if is_starting:
-            logger.debug(f"Started playback initialization for guild {guild_id}")
+            logger.debug("Started playback initialization for guild %s", guild_id)
         else:
-            logger.debug(f"Finished playback initialization for guild {guild_id}")
+            logger.debug("Finished playback initialization for guild %s", guild_id)
     
     def register_task(self, task_id: str, task: asyncio.Task):
         """タスクを登録して管理"""
         self.active_tasks[task_id] = task
-        logger.debug(f"Registered task: {task_id}")
+        logger.debug("Registered task: %s", task_id)
         
         # タスク完了時の自動クリーンアップ
         def cleanup_task(task):
             try:
                 if task_id in self.active_tasks:
                     del self.active_tasks[task_id]
-                    logger.debug(f"Auto-cleaned up completed task: {task_id}")
+                    logger.debug("Auto-cleaned up completed task: %s", task_id)
             except Exception as e:
                 logger.error(f"Error cleaning up task {task_id}: {e}")
         
@@ -631,7 +819,7 @@ class AudioQueue:
             task = self.active_tasks[task_id]
             if not task.done():
                 task.cancel()
-                logger.debug(f"Cancelled task: {task_id}")
+                logger.debug("Cancelled task: %s", task_id)
             del self.active_tasks[task_id]
     
     def cancel_guild_tasks(self, guild_id: int):
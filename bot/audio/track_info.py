@@ -4,11 +4,16 @@
 音楽トラックの情報を格納するクラス
 """
 
+import sys
 from dataclasses import dataclass
 from datetime import datetime
 from typing import Optional
 
-@dataclass
+# Python 3.10以降では__slots__を使用してインスタンスごとの__dict__を省く
+# （file_path・titleはダウンロード後に更新されるため frozen にはしない）
+_DATACLASS_OPTIONS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+@dataclass(**_DATACLASS_OPTIONS)
 class TrackInfo:
     """音楽トラックの情報を格納するデータクラス"""
     url: str
@@ -17,6 +22,7 @@ class TrackInfo:
     added_at: Optional[datetime] = None
     duration: Optional[int] = None
     file_path: Optional[str] = None
+    stream_url: Optional[str] = None  # ダウンロードせずにストリーミング再生する場合の音声URL
     
     def __post_init__(self):
         if self.added_at is None:
@@ -30,7 +36,8 @@ class TrackInfo:
             'user': self.user,
             'added_at': self.added_at,
             'duration': self.duration,
-            'file_path': self.file_path
+            'file_path': self.file_path,
+            'stream_url': self.stream_url
         }
     
     @classmethod
@@ -42,5 +49,6 @@ class TrackInfo:
             user=data.get('user', 'Unknown User'),
             added_at=data.get('added_at'),
             duration=data.get('duration'),
-            file_path=data.get('file_path')
+            file_path=data.get('file_path'),
+            stream_url=data.get('stream_url')
         )
@@ -11,10 +11,20 @@ from discord import app_commands
 import logging
 import os
 
-from ..youtube import YouTubeDownloader, get_title_from_url, validate_youtube_url, normalize_youtube_url, is_playlist_url
+from ..youtube import YouTubeDownloader, run_download, validate_youtube_url, normalize_youtube_url, is_playlist_url
 
 logger = logging.getLogger(__name__)
 
+# Embedの色（呼び出しごとにColorを生成しないよう事前に作成）
+_GREEN = discord.Color.green()
+_ORANGE = discord.Color.orange()
+_BLUE = discord.Color.blue()
+_RED = discord.Color.red()
+
+def _error_embed(title: str, description: str) -> discord.Embed:
+    """エラー表示用の埋め込みメッセージを作成"""
+    return discord.Embed(title=title, description=description, color=_RED)
+
 def setup_download_commands(bot, download_dir: str, max_file_size: int, supported_qualities: list):
     """ダウンロード関連コマンドをセットアップ"""
     
@@ -51,14 +61,11 @@ def setup_download_commands(bot, download_dir: str, max_file_size: int, supporte
             url = normalized_url
             logger.info(f"URL normalized to: {url}")
         
-        # 動画タイトルを取得
-        video_title = get_title_from_url(url)
-        
-        # 処理開始メッセージ
+        # 処理開始メッセージ（Discordの応答期限に間に合うよう、タイトル取得より先に応答する）
         embed = discord.Embed(
             title="📥 ダウンロード開始",
-            description=f"**{video_title}**\n\n📺 **URL:** {url}\n🎬 **画質:** {quality}",
-            color=discord.Color.blue()
+            description=f"📺 **URL:** {url}\n🎬 **画質:** {quality}",
+            color=_BLUE
         )
         embed.add_field(
             name="⏳ ステータス",
@@ -67,20 +74,24 @@ def setup_download_commands(bot, download_dir: str, max_file_size: int, supporte
         )
         await interaction.response.send_message(embed=embed)
         
+        # 動画タイトルを取得（キャッシュ・oEmbedで取得できない場合のみyt-dlpを使用）
+        video_title = await YouTubeDownloader(download_dir).get_video_title_async(url)
+        embed.description = f"**{video_title}**\n\n{embed.description}"
+        await interaction.edit_original_response(embed=embed)
+        
         try:
-            await interaction.followup.send("⏳ ダウンロード中... しばらくお待ちください。")
-            
             # ダウンロード実行
             downloader = YouTubeDownloader(download_dir)
-            success = await asyncio.get_event_loop().run_in_executor(
-                None, downloader.download_video, url, quality
+            success, file_path = await run_download(
+                downloader.download_video, url, quality
             )
             
             if success:
-                # 最新のファイルを取得
-                file_path = downloader.get_latest_video_file()
+                # ダウンロードで確定したファイルを使用
                 if file_path:
-                    file_size = downloader.get_file_size_mb(file_path)
+                    file_size = await asyncio.get_running_loop().run_in_executor(
+                        None, downloader.get_file_size_mb, file_path
+                    )
                     
                     if file_size <= max_file_size:
                         # ファイルサイズが制限内の場合、Discordにアップロード
@@ -88,7 +99,7 @@ def setup_download_commands(bot, download_dir: str, max_file_size: int, supporte
                         embed = discord.Embed(
                             title="✅ ダウンロード完了",
                             description=f"**{video_title}**\n\n📁 **ファイル:** {os.path.basename(file_path)}\n📊 **サイズ:** {file_size:.2f} MB\n🎬 **画質:** {quality}",
-                            color=discord.Color.green()
+                            color=_GREEN
                         )
                         embed.add_field(
                             name="📥 ダウンロード情報",
@@ -98,13 +109,15 @@ def setup_download_commands(bot, download_dir: str, max_file_size: int, supporte
                         await interaction.followup.send(embed=embed, file=file)
                         
                         # ファイルを削除（Discordにアップロード後）
-                        downloader.cleanup_file(file_path)
+                        await asyncio.get_running_loop().run_in_executor(
+                            None, downloader.cleanup_file, file_path
+                        )
                     else:
                         # ファイルサイズが大きすぎる場合
                         embed = discord.Embed(
                             title="⚠️ ファイルサイズが大きすぎます",
                             description=f"**{video_title}**\n\n📊 **ファイルサイズ:** {file_size:.2f} MB\n📏 **Discordの制限:** {max_file_size} MB\n🎬 **画質:** {quality}\n\n容量制限のため、ファイルを削除しました。",
-                            color=discord.Color.orange()
+                            color=_ORANGE
                         )
                         embed.add_field(
                             name="📥 ダウンロード情報",
@@ -114,7 +127,9 @@ def setup_download_commands(bot, download_dir: str, max_file_size: int, supporte
                         await interaction.followup.send(embed=embed)
                         
                         # ファイルを削除
-                        downloader.cleanup_file(file_path)
+                        await asyncio.get_running_loop().run_in_executor(
+                            None, downloader.cleanup_file, file_path
+                        )
                 else:
                     await interaction.followup.send("❌ ダウンロードファイルが見つかりませんでした。")
             else:
@@ -122,34 +137,30 @@ def setup_download_commands(bot, download_dir: str, max_file_size: int, supporte
                 
         except asyncio.TimeoutError:
             logger.error("Download timeout occurred")
-            embed = discord.Embed(
-                title="❌ ダウンロードがタイムアウトしました",
-                description="動画のダウンロードに時間がかかりすぎています。\n短い動画を試すか、しばらく後に再試行してください。",
-                color=discord.Color.red()
+            embed = _error_embed(
+                "❌ ダウンロードがタイムアウトしました",
+                "動画のダウンロードに時間がかかりすぎています。\n短い動画を試すか、しばらく後に再試行してください。"
             )
             await interaction.followup.send(embed=embed)
         except FileNotFoundError as e:
             logger.error(f"yt-dlp not found: {e}")
-            embed = discord.Embed(
-                title="❌ ダウンローダーが見つかりません",
-                description="yt-dlpがインストールされていないか、パスが正しくありません。",
-                color=discord.Color.red()
+            embed = _error_embed(
+                "❌ ダウンローダーが見つかりません",
+                "yt-dlpがインストールされていないか、パスが正しくありません。"
             )
             await interaction.followup.send(embed=embed)
         except PermissionError as e:
             logger.error(f"Permission error during download: {e}")
-            embed = discord.Embed(
-                title="❌ 権限エラー",
-                description="ファイルの書き込み権限がありません。",
-                color=discord.Color.red()
+            embed = _error_embed(
+                "❌ 権限エラー",
+                "ファイルの書き込み権限がありません。"
             )
             await interaction.followup.send(embed=embed)
         except Exception as e:
             logger.error(f"Unexpected download error: {e}")
-            embed = discord.Embed(
-                title="❌ 予期しないエラーが発生しました",
-                description=f"エラー: {str(e)}",
-                color=discord.Color.red()
+            embed = _error_embed(
+                "❌ 予期しないエラーが発生しました",
+                f"エラー: {str(e)}"
             )
             await interaction.followup.send(embed=embed)
 
@@ -173,10 +184,9 @@ def setup_download_commands(bot, download_dir: str, max_file_size: int, supporte
         
         # プレイリストURL検証
         if is_playlist_url(url):
-            embed = discord.Embed(
-                title="❌ プレイリストは変換できません",
-                description="申し訳ございませんが、プレイリストURLには対応していません。\n\n**代替案:**\n• 個別の動画URLを使用してください\n• プレイリスト内の特定の動画を選んでダウンロードしてください",
-                color=discord.Color.red()
+            embed = _error_embed(
+                "❌ プレイリストは変換できません",
+                "申し訳ございませんが、プレイリストURLには対応していません。\n\n**代替案:**\n• 個別の動画URLを使用してください\n• プレイリスト内の特定の動画を選んでダウンロードしてください"
             )
             embed.add_field(
                 name="💡 ヒント",
@@ -192,14 +202,11 @@ def setup_download_commands(bot, download_dir: str, max_file_size: int, supporte
             url = normalized_url
             logger.info(f"URL normalized to: {url}")
         
-        # 動画タイトルを取得
-        video_title = get_title_from_url(url)
-        
-        # 処理開始メッセージ
+        # 処理開始メッセージ（Discordの応答期限に間に合うよう、タイトル取得より先に応答する）
         embed = discord.Embed(
             title="🎵 MP3変換開始",
-            description=f"**{video_title}**\n\n📺 **URL:** {url}\n🎵 **形式:** MP3音声ファイル",
-            color=discord.Color.blue()
+            description=f"📺 **URL:** {url}\n🎵 **形式:** MP3音声ファイル",
+            color=_BLUE
         )
         embed.add_field(
             name="⏳ ステータス",
@@ -208,23 +215,27 @@ def setup_download_commands(bot, download_dir: str, max_file_size: int, supporte
         )
         await interaction.response.send_message(embed=embed)
         
+        # 動画タイトルを取得（キャッシュ・oEmbedで取得できない場合のみyt-dlpを使用）
+        video_title = await YouTubeDownloader(download_dir).get_video_title_async(url)
+        embed.description = f"**{video_title}**\n\n{embed.description}"
+        await interaction.edit_original_response(embed=embed)
+        
         try:
-            await interaction.followup.send("⏳ MP3変換中... しばらくお待ちください。")
-            
             # MP3変換実行
             downloader = YouTubeDownloader(download_dir)
-            download_result = await asyncio.get_event_loop().run_in_executor(
-                None, downloader.download_mp3, url
+            download_result = await run_download(
+                downloader.download_mp3, url
             )
             
-            # download_mp3は(bool, str)のタプルを返す
-            success, downloaded_title = download_result
+            # download_mp3は(bool, str, str)のタプルを返す
+            success, downloaded_title, file_path = download_result
             
             if success:
-                # 最新のMP3ファイルを取得
-                file_path = downloader.get_latest_mp3_file()
+                # ダウンロードで確定したMP3ファイルを使用
                 if file_path:
-                    file_size = downloader.get_file_size_mb(file_path)
+                    file_size = await asyncio.get_running_loop().run_in_executor(
+                        None, downloader.get_file_size_mb, file_path
+                    )
                     
                     if file_size <= max_file_size:
                         file = discord.File(file_path)
@@ -233,7 +244,7 @@ def setup_download_commands(bot, download_dir: str, max_file_size: int, supporte
                         embed = discord.Embed(
                             title="✅ MP3変換完了",
                             description=f"**{display_title}**\n\n📁 **ファイル:** {os.path.basename(file_path)}\n📊 **サイズ:** {file_size:.2f} MB\n🎵 **形式:** MP3音声ファイル",
-                            color=discord.Color.green()
+                            color=_GREEN
                         )
                         embed.add_field(
                             name="📥 ダウンロード情報",
@@ -243,13 +254,15 @@ def setup_download_commands(bot, download_dir: str, max_file_size: int, supporte
                         await interaction.followup.send(embed=embed, file=file)
                         
                         # ファイルを削除
-                        downloader.cleanup_file(file_path)
+                        await asyncio.get_running_loop().run_in_executor(
+                            None, downloader.cleanup_file, file_path
+                        )
                     else:
                         display_title = downloaded_title if downloaded_title != "Unknown Title" else video_title
                         embed = discord.Embed(
                             title="⚠️ ファイルサイズが大きすぎます",
                             description=f"**{display_title}**\n\n📊 **ファイルサイズ:** {file_size:.2f} MB\n📏 **Discordの制限:** {max_file_size} MB\n🎵 **形式:** MP3音声ファイル\n\n容量制限のため、ファイルを削除しました。",
-                            color=discord.Color.orange()
+                            color=_ORANGE
                         )
                         embed.add_field(
                             name="📥 ダウンロード情報",
@@ -259,7 +272,9 @@ def setup_download_commands(bot, download_dir: str, max_file_size: int, supporte
                         await interaction.followup.send(embed=embed)
                         
                         # ファイルを削除
-                        downloader.cleanup_file(file_path)
+                        await asyncio.get_running_loop().run_in_executor(
+                            None, downloader.cleanup_file, file_path
+                        )
                 else:
                     await interaction.followup.send("❌ MP3ファイルが見つかりませんでした。")
             else:
@@ -267,48 +282,46 @@ def setup_download_commands(bot, download_dir: str, max_file_size: int, supporte
                 
         except asyncio.TimeoutError:
             logger.error("MP3 conversion timeout occurred")
-            embed = discord.Embed(
-                title="❌ MP3変換がタイムアウトしました",
-                description="動画のMP3変換に時間がかかりすぎています。\n短い動画を試すか、しばらく後に再試行してください。",
-                color=discord.Color.red()
+            embed = _error_embed(
+                "❌ MP3変換がタイムアウトしました",
+                "動画のMP3変換に時間がかかりすぎています。\n短い動画を試すか、しばらく後に再試行してください。"
             )
             await interaction.followup.send(embed=embed)
         except FileNotFoundError as e:
             logger.error(f"yt-dlp not found for MP3 conversion: {e}")
-            embed = discord.Embed(
-                title="❌ ダウンローダーが見つかりません",
-                description="yt-dlpがインストールされていないか、パスが正しくありません。",
-                color=discord.Color.red()
+            embed = _error_embed(
+                "❌ ダウンローダーが見つかりません",
+                "yt-dlpがインストールされていないか、パスが正しくありません。"
             )
             await interaction.followup.send(embed=embed)
         except PermissionError as e:
             logger.error(f"Permission error during MP3 conversion: {e}")
-            embed = discord.Embed(
-                title="❌ 権限エラー",
-                description="ファイルの書き込み権限がありません。",
-                color=discord.Color.red()
+            embed = _error_embed(
+                "❌ 権限エラー",
+                "ファイルの書き込み権限がありません。"
             )
             await interaction.followup.send(embed=embed)
         except Exception as e:
             logger.error(f"Unexpected MP3 conversion error: {e}")
-            embed = discord.Embed(
-                title="❌ 予期しないエラーが発生しました",
-                description=f"エラー: {str(e)}",
-                color=discord.Color.red()
+            embed = _error_embed(
+                "❌ 予期しないエラーが発生しました",
+                f"エラー: {str(e)}"
             )
             await interaction.followup.send(embed=embed)
 
+    # 画質一覧は設定から決まる固定の内容のため、起動時に一度だけ作成して使い回す
+    quality_embed = discord.Embed(
+        title="🎬 利用可能な画質",
+        description="\n".join(f"• {q}" for q in supported_qualities),
+        color=_BLUE
+    )
+    quality_embed.add_field(
+        name="使用例",
+        value="`/download <URL> <画質>`\n例: `/download https://youtube.com/watch?v=... 1080p`",
+        inline=False
+    )
+    
     @bot.tree.command(name='quality', description='Show available video quality options')
     async def show_quality(interaction: discord.Interaction):
         """利用可能な画質を表示するコマンド"""
-        embed = discord.Embed(
-            title="🎬 利用可能な画質",
-            description="\n".join([f"• {q}" for q in supported_qualities]),
-            color=discord.Color.blue()
-        )
-        embed.add_field(
-            name="使用例",
-            value=f"`/download <URL> <画質>`\n例: `/download https://youtube.com/watch?v=... 1080p`",
-            inline=False
-        )
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+        await interaction.response.send_message(embed=quality_embed, ephemeral=True)
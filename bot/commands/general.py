@@ -11,53 +11,64 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Embedの色（呼び出しごとにColorを生成しないよう事前に作成）
+_BLUE = discord.Color.blue()
+
+# スラッシュコマンドの説明（ヘルプ表示用）
+HELP_COMMANDS = {
+    '/ping': 'ボットの応答テスト（レイテンシ表示）',
+    '/download': 'YouTube動画をダウンロードします（画質はプルダウンメニューから選択）',
+    '/download_mp3': 'YouTube動画をMP3に変換してダウンロードします',
+    '/quality': '利用可能な画質を表示します',
+    '/play': 'YouTube音声をボイスチャンネルで再生します（キューに追加）',
+    '/pause': '音声再生を一時停止します',
+    '/resume': '音声再生を再開します',
+    '/stop': '音声再生を停止し、ボイスチャンネルから切断します',
+    '/skip': '現在再生中の曲をスキップして次の曲を再生します（曲数を指定可能）',
+    '/queue': '現在の音楽キューを表示します',
+    '/clear': '音楽キューをクリアします',
+    '/shuffle': '音楽キューをシャッフルします',
+    '/help': 'コマンド一覧を表示します'
+}
+
+def _build_help_embed() -> discord.Embed:
+    """ヘルプの埋め込みメッセージを作成"""
+    embed = discord.Embed(
+        title="🤖 YouTube Downloader Bot ヘルプ",
+        description="YouTube動画をダウンロードできるDiscordボットです。",
+        color=_BLUE
+    )
+    
+    for command, description in HELP_COMMANDS.items():
+        embed.add_field(
+            name=command,
+            value=description,
+            inline=False
+        )
+    
+    embed.add_field(
+        name="📝 注意事項",
+        value="• ファイルサイズは25MB以下に制限されています\n• 個人使用目的でのみ使用してください\n• YouTubeの利用規約を遵守してください\n• 画質選択はプルダウンメニューから簡単に選択できます",
+        inline=False
+    )
+    
+    return embed
+
 def setup_general_commands(bot):
     """一般的なコマンドをセットアップ"""
     
     @bot.tree.command(name='ping', description='Test bot response')
     async def ping(interaction: discord.Interaction):
-        """ボットの応答テスト用コマンド"""
-        await interaction.response.send_message("🏓 Pong! Bot is working!", ephemeral=True)
+        """ボットの応答テスト用コマンド（Gatewayのレイテンシを表示）"""
+        await interaction.response.send_message(f"🏓 Pong! {bot.latency * 1000:.0f}ms", ephemeral=True)
 
+    # ヘルプの内容は固定のため、起動時に一度だけ作成して使い回す
+    help_embed = _build_help_embed()
+    
     @bot.tree.command(name='help', description='Show bot help and command list')
     async def show_help(interaction: discord.Interaction):
         """ヘルプコマンド"""
-        embed = discord.Embed(
-            title="🤖 YouTube Downloader Bot ヘルプ",
-            description="YouTube動画をダウンロードできるDiscordボットです。",
-            color=discord.Color.blue()
-        )
-        
-        # スラッシュコマンド用に更新
-        slash_commands = {
-            '/ping': 'ボットの応答テスト',
-            '/download': 'YouTube動画をダウンロードします（画質はプルダウンメニューから選択）',
-            '/download_mp3': 'YouTube動画をMP3に変換してダウンロードします',
-            '/quality': '利用可能な画質を表示します',
-            '/play': 'YouTube音声をボイスチャンネルで再生します（キューに追加）',
-            '/pause': '音声再生を一時停止します',
-            '/resume': '音声再生を再開します',
-            '/stop': '音声再生を停止し、ボイスチャンネルから切断します',
-            '/skip': '現在再生中の曲をスキップして次の曲を再生します',
-            '/queue': '現在の音楽キューを表示します',
-            '/clear': '音楽キューをクリアします',
-            '/help': 'コマンド一覧を表示します'
-        }
-        
-        for command, description in slash_commands.items():
-            embed.add_field(
-                name=command,
-                value=description,
-                inline=False
-            )
-        
-        embed.add_field(
-            name="📝 注意事項",
-            value="• ファイルサイズは25MB以下に制限されています\n• 個人使用目的でのみ使用してください\n• YouTubeの利用規約を遵守してください\n• 画質選択はプルダウンメニューから簡単に選択できます",
-            inline=False
-        )
-        
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+        await interaction.response.send_message(embed=help_embed, ephemeral=True)
 
     @bot.event
     async def on_command_error(ctx, error):
@@ -8,16 +8,24 @@ import asyncio
 import os
 import time
 import discord
-from discord.ext import commands
 from discord import app_commands
 import logging
+from typing import Optional
 
 from ..audio import AudioQueue, AudioPlayer, TrackInfo
-from ..youtube import get_title_from_url, validate_youtube_url, normalize_youtube_url, is_playlist_url
-from ..utils.file_utils import cleanup_old_audio_files, force_kill_ffmpeg_processes, get_deletion_queue_status
+from ..youtube import YouTubeDownloader, run_download, validate_youtube_url, normalize_youtube_url, is_playlist_url, extract_video_id
+from ..utils.audio_cache import get_cached_audio
+from ..utils.file_utils import get_deletion_queue_status
 
 logger = logging.getLogger(__name__)
 
+# Embedの色（呼び出しごとにColorを生成しないよう事前に作成）
+_GREEN = discord.Color.green()
+_ORANGE = discord.Color.orange()
+_YELLOW = discord.Color.yellow()
+_BLUE = discord.Color.blue()
+_RED = discord.Color.red()
+
 def setup_music_commands(bot, audio_queue: AudioQueue, audio_player: AudioPlayer, download_dir: str):
     """音楽関連コマンドをセットアップ"""
 
@@ -45,7 +53,7 @@ def setup_music_commands(bot, audio_queue: AudioQueue, audio_player: AudioPlayer
             embed = discord.Embed(
                 title="❌ プレイリストは登録できません",
                 description="申し訳ございませんが、プレイリストURLには対応していません。\n\n**代替案:**\n• 個別の動画URLを使用してください\n• プレイリスト内の特定の動画を選んで再生してください",
-                color=discord.Color.red()
+                color=_RED
             )
             embed.add_field(
                 name="💡 ヒント",
@@ -61,43 +69,20 @@ def setup_music_commands(bot, audio_queue: AudioQueue, audio_player: AudioPlayer
             url = normalized_url
         
         guild_id = interaction.guild_id
-        voice_client = interaction.guild.voice_client
         
-        # ボイスチャンネルに接続していない場合は接続を試行
-        if not voice_client or not voice_client.is_connected():
-            try:
-                voice_channel = interaction.user.voice.channel
-                if not voice_channel:
-                    await interaction.response.send_message(
-                        "❌ ボイスチャンネルに接続してから使用してください。",
-                        ephemeral=True
-                    )
-                    return
-                
-                voice_client = await voice_channel.connect()
-                logger.info(f"Connected to voice channel: {voice_channel.name}")
-                
-                # 接続後に再度確認
-                if not voice_client.is_connected():
-                    await interaction.response.send_message(
-                        "❌ ボイスチャンネルへの接続に失敗しました。",
-                        ephemeral=True
-                    )
-                    return
-                    
-            except Exception as e:
-                logger.error(f"Failed to connect to voice channel: {e}")
-                await interaction.response.send_message(
-                    "❌ ボイスチャンネルに接続できませんでした。権限を確認してください。",
-                    ephemeral=True
-                )
-                return
+        # キューが満杯の場合は受け付けない
+        if audio_queue.is_queue_full(guild_id):
+            await interaction.response.send_message(
+                f"❌ キューが満杯です（最大{audio_queue.max_queue_size}曲）。",
+                ephemeral=True
+            )
+            return
         
-        # 即座に応答
+        # ボイスチャンネルへの接続や動画情報の取得は時間がかかるため、先に応答しておく
         embed = discord.Embed(
             title="🎵 音声準備開始",
             description=f"**URL：** {url}\n👤 **リクエスト:** {interaction.user.display_name}",
-            color=discord.Color.blue()
+            color=_BLUE
         )
         embed.add_field(
             name="⏳ ステータス",
@@ -106,14 +91,48 @@ def setup_music_commands(bot, audio_queue: AudioQueue, audio_player: AudioPlayer
         )
         await interaction.response.send_message(embed=embed)
         
-        # URLからタイトルを取得（まずYouTubeDownloaderを試し、失敗した場合はget_title_from_urlを使用）
-        from ..youtube import YouTubeDownloader
-        downloader = YouTubeDownloader()
-        video_title = downloader.get_video_title(url)
+        # 再生ロックを取得してから接続する
+        # （アイドルタイムアウトによる切断と新しい接続が競合しないようにする）
+        playback_lock = await audio_queue.get_playback_lock(guild_id)
+        async with playback_lock:
+            # 保留中のアイドル切断をキャンセル
+            audio_queue.cancel_idle_timeout(guild_id)
+            
+            voice_client = interaction.guild.voice_client
+            
+            # ボイスチャンネルに接続していない場合は接続を試行
+            if not voice_client or not voice_client.is_connected():
+                try:
+                    voice_channel = interaction.user.voice.channel
+                    if not voice_channel:
+                        await interaction.edit_original_response(
+                            content="❌ ボイスチャンネルに接続してから使用してください。",
+                            embed=None
+                        )
+                        return
+                    
+                    voice_client = await voice_channel.connect()
+                    logger.info(f"Connected to voice channel: {voice_channel.name}")
+                    
+                    # 接続後に再度確認
+                    if not voice_client.is_connected():
+                        await interaction.edit_original_response(
+                            content="❌ ボイスチャンネルへの接続に失敗しました。",
+                            embed=None
+                        )
+                        return
+                        
+                except Exception as e:
+                    logger.error(f"Failed to connect to voice channel: {e}")
+                    await interaction.edit_original_response(
+                        content="❌ ボイスチャンネルに接続できませんでした。権限を確認してください。",
+                        embed=None
+                    )
+                    return
         
-        # YouTubeDownloaderでタイトル取得に失敗した場合は、url_handlerの関数を使用
-        if video_title == "Unknown Title":
-            video_title = get_title_from_url(url)
+        # URLからタイトルを取得（キャッシュ・oEmbedで取得できない場合のみyt-dlpを使用）
+        downloader = YouTubeDownloader()
+        video_title = await downloader.get_video_title_async(url)
         
         # トラック情報を作成
         track_info = TrackInfo(
@@ -124,8 +143,6 @@ def setup_music_commands(bot, audio_queue: AudioQueue, audio_player: AudioPlayer
         )
         
         # 再生ロックを取得して同時実行を制御
-        playback_lock = await audio_queue.get_playback_lock(guild_id)
-        
         async with playback_lock:
             # テキストチャンネルIDを保存
             audio_queue.set_text_channel(guild_id, interaction.channel_id)
@@ -148,10 +165,10 @@ def setup_music_commands(bot, audio_queue: AudioQueue, audio_player: AudioPlayer
                     pending_requests = audio_queue.get_pending_requests(guild_id)
                     total_participants = len(pending_requests) + 1  # 現在ダウンロード中の曲も含む
                     
-                    # 保留リクエスト通知（競争する主要2つのタイトルと説明）
+                    # 準備開始メッセージを保留リクエスト通知に更新（競争する主要2つのタイトルと説明）
                     embed = discord.Embed(
                         title="🏁 ダウンロード競争開始",
-                        color=discord.Color.orange()
+                        color=_ORANGE
                     )
                     
                     if total_participants == 2:
@@ -174,7 +191,7 @@ def setup_music_commands(bot, audio_queue: AudioQueue, audio_player: AudioPlayer
                         value="先にダウンロードが完了した曲が再生され、\n他の曲は自動的にキューに追加されます",
                         inline=False
                     )
-                    await interaction.followup.send(embed=embed)
+                    await interaction.edit_original_response(embed=embed)
                     
                     # 競争ダウンロードを開始
                     task_id = f"guild_{guild_id}_competitive_{hash(track_info.url)}"
@@ -184,23 +201,30 @@ def setup_music_commands(bot, audio_queue: AudioQueue, audio_player: AudioPlayer
                     audio_queue.register_task(task_id, task)
                 else:
                     # 通常のキュー追加
-                    audio_queue.add_track(guild_id, track_info)
+                    if not audio_queue.add_track(guild_id, track_info):
+                        embed = discord.Embed(
+                            title="❌ キューが満杯です",
+                            description=f"**タイトル：** {video_title}\n\nキューに追加できるのは最大{audio_queue.max_queue_size}曲です。",
+                            color=_RED
+                        )
+                        await interaction.edit_original_response(embed=embed)
+                        return
                     
                     # 事前ダウンロードを開始
                     audio_queue.start_preload(guild_id)
                     
-                    # キューに追加メッセージを更新
+                    # 準備開始メッセージをキューに追加メッセージに更新
                     embed = discord.Embed(
                         title="🎵 キューに追加",
                         description=f"**タイトル：** {video_title}\n\n**URL：** {url}\n👤 **リクエスト:** {interaction.user.display_name}\n📋 **現在のキュー:** {audio_queue.get_queue_length(guild_id)}曲",
-                        color=discord.Color.blue()
+                        color=_BLUE
                     )
                     embed.add_field(
                         name="⏳ ステータス",
                         value="キューに追加されました。順番をお待ちください。",
                         inline=False
                     )
-                    await interaction.followup.send(embed=embed)
+                    await interaction.edit_original_response(embed=embed)
                     
                     # バックグラウンドでダウンロード開始
                     task_id = f"guild_{guild_id}_background_{hash(track_info.url)}"
@@ -235,45 +259,27 @@ def setup_music_commands(bot, audio_queue: AudioQueue, audio_player: AudioPlayer
         try:
             guild_id = interaction.guild_id
             
-            # アイドルタイムアウトをキャンセル
-            audio_queue.cancel_idle_timeout(guild_id)
-            
-            # 音声再生を停止
-            audio_player.stop_playback(guild_id, voice_client)
-            
-            # キューと現在再生中のトラックをクリア
-            audio_queue.clear_queue(guild_id)
-            audio_queue.clear_now_playing(guild_id)
-            
-            # ループもリセット
-            audio_queue.set_loop(guild_id, False)
-            
-            # 事前ダウンロードもキャンセル
-            audio_queue.cancel_downloads(guild_id)
-            
-            # 保留中のリクエストもクリア
-            audio_queue.clear_pending_requests(guild_id)
-            
-            # 再生開始フラグもリセット
-            audio_queue.set_starting_playback(guild_id, False)
-            
-            # 少し待ってから切断
-            await asyncio.sleep(1)
-            
-            # ボイスチャンネルから切断
-            await voice_client.disconnect()
-            logger.info("Disconnected from voice channel")
+            # 先にキュー・再生中トラック・ループ・保留リクエストとアイドルタイムアウトを破棄
+            # （停止による再生終了コールバックで次の曲が再生されないようにする）
+            audio_queue.remove_guild_data(guild_id)
             
             embed = discord.Embed(
                 title="🛑 再生停止",
                 description="音声再生を停止し、ボイスチャンネルから切断しました。\nキューもクリアされました。",
-                color=discord.Color.orange()
+                color=_ORANGE
+            )
+            # 応答の送信と停止・切断処理を並行して行う
+            await asyncio.gather(
+                interaction.response.send_message(embed=embed),
+                _stop_and_disconnect(guild_id, voice_client, audio_queue, audio_player)
             )
-            await interaction.response.send_message(embed=embed)
             
         except Exception as e:
             logger.error(f"Stop command error: {e}")
-            await interaction.response.send_message("❌ 音声停止に失敗しました。")
+            if interaction.response.is_done():
+                await interaction.followup.send("❌ 音声停止に失敗しました。")
+            else:
+                await interaction.response.send_message("❌ 音声停止に失敗しました。")
 
     @bot.tree.command(name='pause', description='Pause audio playback')
     async def pause_audio(interaction: discord.Interaction):
@@ -303,7 +309,7 @@ def setup_music_commands(bot, audio_queue: AudioQueue, audio_player: AudioPlayer
                 embed = discord.Embed(
                     title="⏸️ 一時停止",
                     description="音声再生を一時停止しました。",
-                    color=discord.Color.yellow()
+                    color=_YELLOW
                 )
                 await interaction.response.send_message(embed=embed)
             else:
@@ -340,7 +346,7 @@ def setup_music_commands(bot, audio_queue: AudioQueue, audio_player: AudioPlayer
                 embed = discord.Embed(
                     title="▶️ 再生再開",
                     description="音声再生を再開しました。",
-                    color=discord.Color.green()
+                    color=_GREEN
                 )
                 await interaction.response.send_message(embed=embed)
             else:
@@ -353,12 +359,13 @@ def setup_music_commands(bot, audio_queue: AudioQueue, audio_player: AudioPlayer
     async def show_queue(interaction: discord.Interaction):
         """現在の音楽キューを表示するコマンド"""
         guild_id = interaction.guild_id
-        queue = audio_queue.get_queue(guild_id)
+        queue_text = audio_queue.get_queue_text(guild_id)  # 最大10曲まで表示
+        queue_length = audio_queue.get_queue_length(guild_id)
         now_playing = audio_queue.get_now_playing(guild_id)
         
         embed = discord.Embed(
             title="🎵 音楽キュー",
-            color=discord.Color.blue()
+            color=_BLUE
         )
         
         if now_playing:
@@ -377,16 +384,9 @@ def setup_music_commands(bot, audio_queue: AudioQueue, audio_player: AudioPlayer
                     inline=False
                 )
         
-        if queue:
-            queue_text = ""
-            for i, track in enumerate(queue[:10], 1):  # 最大10曲まで表示
-                queue_text += f"{i}. **{track.title}**\n   追加者: {track.user}\n"
-            
-            if len(queue) > 10:
-                queue_text += f"\n... 他 {len(queue) - 10} 曲"
-            
+        if queue_text:
             embed.add_field(
-                name=f"📋 キュー ({len(queue)}曲)",
+                name=f"📋 キュー ({queue_length}曲)",
                 value=queue_text,
                 inline=False
             )
@@ -411,7 +411,7 @@ def setup_music_commands(bot, audio_queue: AudioQueue, audio_player: AudioPlayer
             embed = discord.Embed(
                 title="📋 キューは空です",
                 description="クリアするキューがありません。",
-                color=discord.Color.blue()
+                color=_BLUE
             )
         else:
             audio_queue.clear_queue(guild_id)
@@ -419,11 +419,33 @@ def setup_music_commands(bot, audio_queue: AudioQueue, audio_player: AudioPlayer
             embed = discord.Embed(
                 title="🗑️ キューをクリア",
                 description=f"{queue_length}曲のキューがクリアされました。\n現在再生中の曲は影響を受けません。",
-                color=discord.Color.orange()
+                color=_ORANGE
             )
         
         await interaction.response.send_message(embed=embed, ephemeral=True)
     
+    @bot.tree.command(name='shuffle', description='Shuffle music queue')
+    async def shuffle_queue(interaction: discord.Interaction):
+        """音楽キューをシャッフルするコマンド"""
+        guild_id = interaction.guild_id
+        
+        shuffled_count = audio_queue.shuffle_queue(guild_id)
+        
+        if shuffled_count == 0:
+            embed = discord.Embed(
+                title="📋 シャッフルできません",
+                description="キューに2曲以上ある場合のみシャッフルできます。",
+                color=_BLUE
+            )
+        else:
+            embed = discord.Embed(
+                title="🔀 キューをシャッフル",
+                description=f"{shuffled_count}曲のキューをシャッフルしました。\n現在再生中の曲は影響を受けません。",
+                color=_GREEN
+            )
+        
+        await interaction.response.send_message(embed=embed)
+    
     @bot.tree.command(name='preload', description='事前ダウンロードの状況を表示')
     async def show_preload_status(interaction: discord.Interaction):
         """事前ダウンロードの状況を表示"""
@@ -437,7 +459,7 @@ def setup_music_commands(bot, audio_queue: AudioQueue, audio_player: AudioPlayer
             # 埋め込みメッセージを作成
             embed = discord.Embed(
                 title="📥 事前ダウンロード状況",
-                color=discord.Color.blue()
+                color=_BLUE
             )
             
             # 基本統計
@@ -523,7 +545,7 @@ def setup_music_commands(bot, audio_queue: AudioQueue, audio_player: AudioPlayer
             
             embed = discord.Embed(
                 title="🔧 デバッグ情報",
-                color=discord.Color.blue()
+                color=_BLUE
             )
             
             # ギルドの音楽状態
@@ -590,7 +612,8 @@ def setup_music_commands(bot, audio_queue: AudioQueue, audio_player: AudioPlayer
             )
 
     @bot.tree.command(name='skip', description='Skip current track and play next track in queue')
-    async def skip_audio(interaction: discord.Interaction):
+    @app_commands.describe(count='スキップする曲数（現在の曲を含む）')
+    async def skip_audio(interaction: discord.Interaction, count: app_commands.Range[int, 1, 100] = 1):
         """現在再生中の曲をスキップするコマンド"""
         voice_client = interaction.guild.voice_client
         if not voice_client:
@@ -618,22 +641,30 @@ def setup_music_commands(bot, audio_queue: AudioQueue, audio_player: AudioPlayer
             # アイドルタイムアウトをキャンセル（スキップ処理のため）
             audio_queue.cancel_idle_timeout(guild_id)
             
+            # 複数曲スキップの場合は、現在の曲以外の分をキューの先頭から取り除く
+            skipped_queued = audio_queue.skip_tracks(guild_id, count - 1) if count > 1 else 0
+            
             # 次の曲があるかチェック（ループを考慮）
             if audio_queue.is_loop_enabled(guild_id):
                 # ループが有効な場合は同じ曲をリピート
                 next_title = current_title
             else:
                 # ループが無効な場合は通常のキューから次の曲を取得
-                queue = audio_queue.get_queue(guild_id)
-                next_track = queue[0] if queue else None
+                next_track = audio_queue.peek_next_track(guild_id)
                 next_title = next_track.title if next_track else None
             
             # 即座に応答を送信
             embed = discord.Embed(
                 title="⏭️ スキップ",
                 description=f"**現在の曲をスキップします**\n\n🎵 **スキップする曲：** {current_title}",
-                color=discord.Color.blue()
+                color=_BLUE
             )
+            if skipped_queued:
+                embed.add_field(
+                    name="🗑️ キューからスキップ",
+                    value=f"{skipped_queued}曲",
+                    inline=False
+                )
             if next_title:
                 embed.add_field(
                     name="⏭️ 次の曲",
@@ -689,7 +720,7 @@ def setup_music_commands(bot, audio_queue: AudioQueue, audio_player: AudioPlayer
         
         # 現在再生中の曲があるかチェック
         if not audio_player.is_playing(voice_client):
-            logger.debug(f"Loop command failed: not playing audio for guild {guild_id}")
+            logger.debug("Loop command failed: not playing audio for guild %s", guild_id)
             await interaction.response.send_message(
                 "❌ 現在音声を再生していません。\nループを有効にするには、まず曲を再生してください。",
                 ephemeral=True
@@ -700,7 +731,7 @@ def setup_music_commands(bot, audio_queue: AudioQueue, audio_player: AudioPlayer
             # 現在再生中のトラック情報を取得
             current_track = audio_queue.get_now_playing(guild_id)
             if not current_track:
-                logger.debug(f"Loop command failed: no current track for guild {guild_id}")
+                logger.debug("Loop command failed: no current track for guild %s", guild_id)
                 await interaction.response.send_message(
                     "❌ 現在再生中のトラック情報が見つかりません。",
                     ephemeral=True
@@ -714,7 +745,7 @@ def setup_music_commands(bot, audio_queue: AudioQueue, audio_player: AudioPlayer
                 embed = discord.Embed(
                     title="🔁 ループ有効",
                     description=f"**現在の曲をループします**\n\n🎵 **ループ中の曲：** {current_track.title}",
-                    color=discord.Color.green()
+                    color=_GREEN
                 )
                 embed.add_field(
                     name="💡 ヒント",
@@ -729,7 +760,7 @@ def setup_music_commands(bot, audio_queue: AudioQueue, audio_player: AudioPlayer
                 embed = discord.Embed(
                     title="🔁 ループ無効",
                     description="**ループを無効にしました**\n\n曲が終了したら次の曲に進みます。",
-                    color=discord.Color.orange()
+                    color=_ORANGE
                 )
                 
             await interaction.response.send_message(embed=embed)
@@ -757,34 +788,50 @@ async def download_and_play_track(guild_id: int, track_info: TrackInfo, voice_cl
             logger.info(f"Using preloaded track: {preloaded_track.title}")
             track_info = preloaded_track  # ダウンロード済みの情報を使用
             success = True
+        elif track_info.stream_url or (
+            track_info.file_path and
+            await asyncio.get_running_loop().run_in_executor(None, os.path.exists, track_info.file_path)
+        ):
+            # ダウンロード済み、またはストリーミング中の曲（ループ再生など）
+            success = True
         else:
-            # リアルタイムダウンロード
-            logger.info(f"Real-time downloading: {track_info.title}")
-            from ..youtube import YouTubeDownloader
-            
+            loop = asyncio.get_running_loop()
             downloader = YouTubeDownloader()
             
-            # MP3をダウンロード
-            download_result = await asyncio.get_event_loop().run_in_executor(
-                None, downloader.download_mp3, track_info.url
-            )
+            # 動画IDごとのキャッシュがあれば、yt-dlpを起動せずにそのファイルを再生する
+            cached_path = None
+            video_id = extract_video_id(track_info.url)
+            if video_id:
+                cached_path = await loop.run_in_executor(
+                    None, get_cached_audio, downloader.download_dir, video_id
+                )
             
-            # download_mp3は(bool, str)のタプルを返すため、成功可否のみを取得
-            if isinstance(download_result, tuple):
-                success, downloaded_title = download_result
-                # タイトルが取得できた場合は更新
-                if downloaded_title and downloaded_title != "Unknown Title":
-                    track_info.title = downloaded_title
+            if cached_path:
+                logger.info(f"Playing cached audio: {track_info.title}")
+                track_info.file_path = cached_path
+                track_info.stream_url = None
+                success = True
             else:
-                # 後方互換性のため、boolが返された場合はそのまま使用
-                success = download_result
-            
-            if success:
-                # 最新のMP3ファイルを取得
-                file_path = downloader.get_latest_mp3_file()
-                track_info.file_path = file_path
+                # ダウンロード完了を待たずにストリーミング再生する
+                logger.info(f"Resolving stream for: {track_info.title}")
+                stream_result = await loop.run_in_executor(
+                    None, downloader.get_stream_url, track_info.url
+                )
+                
+                # get_stream_urlは(bool, str, str)のタプルを返す
+                success, stream_title, stream_url = stream_result
+                
+                if success:
+                    if stream_title and stream_title != "Unknown Title":
+                        track_info.title = stream_title
+                    track_info.file_path = None
+                    track_info.stream_url = stream_url
+                else:
+                    # ストリームURLが取得できない場合はリアルタイムダウンロード
+                    logger.info(f"Real-time downloading: {track_info.title}")
+                    success = await _download_track(track_info)
         
-        if success and track_info.file_path:
+        if success and (track_info.file_path or track_info.stream_url):
             # 再生終了時のコールバック
             async def on_finish(error, guild_id, track_info):
                 # 完了したダウンロードをクリーンアップ
@@ -803,19 +850,10 @@ async def download_and_play_track(guild_id: int, track_info: TrackInfo, voice_cl
                         audio_queue.start_preload(guild_id)
                     else:
                         logger.info(f"🔁 Loop enabled, repeating track: {next_track.title}")
-                    
-                    # テキストチャンネルIDを渡して次の曲も通知を表示
-                    # 保存されているテキストチャンネルIDを取得
-                    saved_channel_id = audio_queue.get_text_channel(guild_id)
-                    channel_id_to_use = text_channel_id or saved_channel_id
-                    logger.info(f"📢 Using text channel {channel_id_to_use} for notification (text_channel_id={text_channel_id}, saved={saved_channel_id})")
-                    await download_and_play_track(guild_id, next_track, voice_client, audio_queue, audio_player, channel_id_to_use)
-                else:
-                    # 現在再生中のトラックをクリア（次の曲がない場合）
-                    audio_queue.clear_now_playing(guild_id)
-                    # キューが空の場合は5分間のアイドルタイムアウトを開始
-                    if voice_client and voice_client.is_connected():
-                        audio_queue.start_idle_timeout(guild_id, voice_client)
+                
+                # テキストチャンネルIDを渡して次の曲も通知を表示
+                channel_id_to_use = text_channel_id or audio_queue.get_text_channel(guild_id)
+                await _play_next_or_idle(guild_id, next_track, voice_client, audio_queue, audio_player, channel_id_to_use)
             
             # 既に再生中でない場合のみ再生開始
             if not audio_player.is_playing(voice_client):
@@ -824,7 +862,7 @@ async def download_and_play_track(guild_id: int, track_info: TrackInfo, voice_cl
                 
                 # ループかどうかを判定
                 is_loop_track = audio_queue.is_loop_enabled(guild_id)
-                logger.info(f"🔄 Loop check for guild {guild_id}: is_loop_enabled={is_loop_track}, track={track_info.title}")
+                logger.debug("🔄 Loop check for guild %s: is_loop_enabled=%s, track=%s", guild_id, is_loop_track, track_info.title)
                 
                 # 再生開始
                 success = await audio_player.play_track(guild_id, track_info, voice_client, on_finish, is_loop_track)
@@ -838,6 +876,19 @@ async def download_and_play_track(guild_id: int, track_info: TrackInfo, voice_cl
                     logger.error(f"Failed to start playback for guild {guild_id}, track: {track_info.title}")
                 else:
                     logger.info(f"Started playback for guild {guild_id}, track: {track_info.title}, loop: {is_loop_track}")
+                    
+                    # ストリーミング再生中の曲はキャッシュにも保存し、再リクエストやループ時はファイルから再生する
+                    # （再生中のTrackInfoを別タスクから書き換えないよう、コピーをダウンロードする）
+                    if track_info.stream_url and not track_info.file_path:
+                        cache_track = TrackInfo(
+                            url=track_info.url,
+                            title=track_info.title,
+                            user=track_info.user,
+                            added_at=track_info.added_at
+                        )
+                        task_id = f"guild_{guild_id}_cache_{hash(track_info.url)}"
+                        task = asyncio.create_task(start_background_download(guild_id, cache_track, audio_queue))
+                        audio_queue.register_task(task_id, task)
             else:
                 logger.warning(f"Already playing audio for guild {guild_id}, skipping playback of: {track_info.title}")
                 success = False
@@ -849,76 +900,29 @@ async def download_and_play_track(guild_id: int, track_info: TrackInfo, voice_cl
                 channel_id_for_notification = text_channel_id or audio_queue.get_text_channel(guild_id)
                 
                 if channel_id_for_notification:
-                    # ループ時か通常再生かを判定
-                    is_loop_replay = audio_queue.is_loop_enabled(guild_id)
-                    
-                    # 再生開始通知
-                    if is_loop_replay:
-                        embed = discord.Embed(
-                            title="🔁 ループ再生",
-                            description=f"**タイトル：** {track_info.title}",
-                            color=discord.Color.orange()
-                        )
-                    else:
-                        embed = discord.Embed(
-                            title="🎵 再生開始",
-                            description=f"**タイトル：** {track_info.title}",
-                            color=discord.Color.green()
-                        )
-                
-                    # URL情報を追加（短縮表示）
-                    if len(track_info.url) > 60:
-                        short_url = track_info.url[:60] + "..."
-                    else:
-                        short_url = track_info.url
-                    embed.add_field(
-                        name="🔗 URL",
-                        value=f"[リンク]({track_info.url})",
-                        inline=False
-                    )
-                    
-                    # ファイル情報を追加
-                    if track_info.file_path:
-                        try:
-                            from ..youtube import YouTubeDownloader
-                            downloader = YouTubeDownloader()
-                            file_size = downloader.get_file_size_mb(track_info.file_path)
-                            embed.add_field(
-                                name="📁 ファイル",
-                                value=f"{file_size:.1f} MB",
-                                inline=True
-                            )
-                        except Exception:
-                            pass
-                    
-                    # キューの状況を追加
-                    queue_length = audio_queue.get_queue_length(guild_id)
-                    if queue_length > 0:
-                        embed.add_field(
-                            name="📋 キュー",
-                            value=f"次に{queue_length}曲待機中",
-                            inline=True
-                        )
-                    
-                    # ユーザー情報を追加
-                    if hasattr(track_info, 'user') and track_info.user:
-                        embed.add_field(
-                            name="👤 リクエスト",
-                            value=track_info.user,
-                            inline=True
-                        )
-                    
-                    # ループ状態の表示
-                    if audio_queue.is_loop_enabled(guild_id):
-                        embed.add_field(
-                            name="🔁 ループ",
-                            value="有効",
-                            inline=True
-                        )
-                    
                     try:
-                        channel = voice_client.guild.get_channel(channel_id_for_notification)
-                        if channel and channel.permissions_for(voice_client.guild.me).send_messages:
+                        # 送信先が見つからない場合は通知の準備自体を行わない
+                        channel = audio_queue.get_notification_channel(voice_client.guild, channel_id_for_notification)
+                        if channel:
+                            # ファイルサイズはイベントループを塞がないようにスレッドプールで取得
+                            file_size = None
+                            if track_info.file_path:
+                                try:
+                                    downloader = YouTubeDownloader()
+                                    file_size = await asyncio.get_running_loop().run_in_executor(
+                                        None, downloader.get_file_size_mb, track_info.file_path
+                                    )
+                                except Exception:
+                                    pass
+                            
+                            # 再生開始通知
+                            embed = _build_now_playing_embed(
+                                track_info,
+                                audio_queue.is_loop_enabled(guild_id),
+                                audio_queue.get_queue_length(guild_id),
+                                file_size
+                            )
+                            
                             # 通知送信をasyncio.create_taskで安全に実行
                             async def send_notification():
                                 try:
@@ -926,10 +930,11 @@ async def download_and_play_track(guild_id: int, track_info: TrackInfo, voice_cl
                                     logger.info(f"✅ Playback notification sent to channel {channel_id_for_notification} for guild {guild_id}: {track_info.title}")
                                 except asyncio.TimeoutError:
                                     logger.warning(f"Notification send timeout for channel {channel_id_for_notification}")
-                                except discord.HTTPException as e:
-                                    logger.warning(f"Discord HTTP error when sending notification: {e}")
                                 except discord.Forbidden:
+                                    audio_queue.invalidate_notification_channel(guild_id)
                                     logger.warning(f"No permission to send message in channel {channel_id_for_notification}")
+                                except discord.HTTPException as e:
+                                    logger.warning(f"Discord HTTP error when sending notification: {e}")
                                 except Exception as e:
                                     logger.error(f"Error sending notification: {e}")
                             
@@ -960,44 +965,147 @@ async def download_and_play_track(guild_id: int, track_info: TrackInfo, voice_cl
         try:
             audio_queue.clear_now_playing(guild_id)
             next_track = audio_queue.get_next_track(guild_id)
-            if next_track and voice_client and voice_client.is_connected():
+            if next_track:
                 logger.info(f"Attempting to play next track after error for guild {guild_id}")
-                saved_channel_id = audio_queue.get_text_channel(guild_id)
-                await download_and_play_track(guild_id, next_track, voice_client, audio_queue, audio_player, saved_channel_id)
-            else:
-                # 次の曲がない場合はアイドルタイムアウトを開始
-                if voice_client and voice_client.is_connected():
-                    audio_queue.start_idle_timeout(guild_id, voice_client)
+            await _play_next_or_idle(
+                guild_id, next_track, voice_client, audio_queue, audio_player,
+                audio_queue.get_text_channel(guild_id)
+            )
         except Exception as recovery_error:
             logger.error(f"Failed to recover from error for guild {guild_id}: {recovery_error}")
 
+def _build_now_playing_embed(track_info: TrackInfo, is_loop: bool, queue_length: int,
+                             file_size: Optional[float] = None) -> discord.Embed:
+    """再生開始通知の埋め込みメッセージを作成"""
+    if is_loop:
+        embed = discord.Embed(
+            title="🔁 ループ再生",
+            description=f"**タイトル：** {track_info.title}",
+            color=_ORANGE
+        )
+    else:
+        embed = discord.Embed(
+            title="🎵 再生開始",
+            description=f"**タイトル：** {track_info.title}",
+            color=_GREEN
+        )
+    
+    embed.add_field(
+        name="🔗 URL",
+        value=f"[リンク]({track_info.url})",
+        inline=False
+    )
+    
+    # ファイル情報を追加
+    if file_size is not None:
+        embed.add_field(
+            name="📁 ファイル",
+            value=f"{file_size:.1f} MB",
+            inline=True
+        )
+    
+    # キューの状況を追加
+    if queue_length > 0:
+        embed.add_field(
+            name="📋 キュー",
+            value=f"次に{queue_length}曲待機中",
+            inline=True
+        )
+    
+    # ユーザー情報を追加
+    if track_info.user:
+        embed.add_field(
+            name="👤 リクエスト",
+            value=track_info.user,
+            inline=True
+        )
+    
+    # ループ状態の表示
+    if is_loop:
+        embed.add_field(
+            name="🔁 ループ",
+            value="有効",
+            inline=True
+        )
+    
+    return embed
+
+async def _play_next_or_idle(guild_id: int, next_track: Optional[TrackInfo], voice_client,
+                             audio_queue: AudioQueue, audio_player: AudioPlayer, text_channel_id: int = None):
+    """次の曲を再生する（次の曲がない場合はアイドルタイムアウトを開始）"""
+    is_connected = voice_client and voice_client.is_connected()
+    if next_track and is_connected:
+        await download_and_play_track(guild_id, next_track, voice_client, audio_queue, audio_player, text_channel_id)
+        return
+    
+    # 現在再生中のトラックをクリア（次の曲がない場合）
+    audio_queue.clear_now_playing(guild_id)
+    # キューが空の場合は5分間のアイドルタイムアウトを開始
+    if is_connected:
+        audio_queue.start_idle_timeout(guild_id, voice_client)
+
+async def _stop_and_disconnect(guild_id: int, voice_client, audio_queue: AudioQueue,
+                               audio_player: AudioPlayer):
+    """再生を停止し、FFmpegプロセスの終了を待ってからボイスチャンネルを切断する"""
+    await audio_player.stop_playback_and_wait(guild_id, voice_client)
+    
+    # 切断し、停止中に作られた状態と事前ダウンロードも破棄
+    await audio_queue.disconnect_guild(guild_id, voice_client)
+
+async def _download_track(track_info: TrackInfo) -> bool:
+    """
+    再生用音声をダウンロードし、トラック情報のタイトルとファイルパスを更新する
+    
+    Returns:
+        bool: ダウンロードに成功したかどうか
+    """
+    downloader = YouTubeDownloader()
+    
+    # download_audioは(bool, str, str)のタプルを返す
+    success, downloaded_title, file_path = await run_download(
+        downloader.download_audio, track_info.url
+    )
+    # タイトルが取得できた場合は更新
+    if downloaded_title and downloaded_title != "Unknown Title":
+        track_info.title = downloaded_title
+    
+    if success:
+        # ダウンロードで確定した音声ファイルを使用
+        track_info.file_path = file_path
+    return success
+
+async def _notify_queue_full(guild_id: int, audio_queue: AudioQueue, guild, description: str):
+    """キューが満杯で曲を追加できなかったことを保存済みのテキストチャンネルに通知"""
+    channel = audio_queue.get_notification_channel(guild)
+    if not channel:
+        logger.warning(f"Cannot send queue-full notification for guild {guild_id}: channel not found or no permission")
+        return
+    
+    embed = discord.Embed(
+        title="❌ キューが満杯です",
+        description=f"{description}\n\nキューに追加できるのは最大{audio_queue.max_queue_size}曲です。",
+        color=_RED
+    )
+    try:
+        await asyncio.wait_for(channel.send(embed=embed), timeout=10.0)
+    except asyncio.TimeoutError:
+        logger.warning(f"Queue-full notification send timeout for guild {guild_id}")
+    except discord.Forbidden:
+        audio_queue.invalidate_notification_channel(guild_id)
+        logger.warning(f"No permission to send queue-full notification for guild {guild_id}")
+    except discord.HTTPException as e:
+        logger.warning(f"Discord HTTP error when sending queue-full notification: {e}")
+
 async def start_competitive_download(guild_id: int, track_info: TrackInfo, audio_queue: AudioQueue, 
                                    audio_player: AudioPlayer, voice_client):
     """競争ダウンロードを開始（先に完了した方が再生される）"""
     try:
-        from ..youtube import YouTubeDownloader
-        
         logger.info(f"🏁 Starting competitive download for guild {guild_id}: {track_info.title}")
         
-        downloader = YouTubeDownloader()
-        
         # ダウンロードを実行
-        download_result = await asyncio.get_event_loop().run_in_executor(
-            None, downloader.download_mp3, track_info.url
-        )
-        
-        # ダウンロード結果を処理
-        if isinstance(download_result, tuple):
-            success, downloaded_title = download_result
-            if downloaded_title and downloaded_title != "Unknown Title":
-                track_info.title = downloaded_title
-        else:
-            success = download_result
-        
-        if success:
-            # ファイルパスを設定
-            file_path = downloader.get_latest_mp3_file()
-            track_info.file_path = file_path
+        if await _download_track(track_info):
+            # キュー満杯の通知は再生ロックを解放してから送信する
+            queue_full_message = None
             
             # 再生ロックを取得して競争の勝者を決定
             playback_lock = await audio_queue.get_playback_lock(guild_id)
@@ -1014,7 +1122,9 @@ async def start_competitive_download(guild_id: int, track_info: TrackInfo, audio
                     logger.info(f"🏆 Competitive download winner for guild {guild_id}: {track_info.title}")
                     
                     # 保留中のリクエストをキューに移動（勝者の曲は除く）
-                    audio_queue.move_pending_to_queue(guild_id, track_info)
+                    dropped_count = audio_queue.move_pending_to_queue(guild_id, track_info)
+                    if dropped_count > 0:
+                        queue_full_message = f"保留中のリクエスト{dropped_count}曲を追加できませんでした。"
                     
                     # 勝者の曲を再生
                     await download_and_play_track(
@@ -1024,7 +1134,11 @@ async def start_competitive_download(guild_id: int, track_info: TrackInfo, audio
                 else:
                     # 既に他の曲が再生開始している場合はキューに追加
                     logger.info(f"🥈 Competitive download runner-up, adding to queue for guild {guild_id}: {track_info.title}")
-                    audio_queue.add_track(guild_id, track_info)
+                    if not audio_queue.add_track(guild_id, track_info):
+                        queue_full_message = f"**タイトル：** {track_info.title}"
+            
+            if queue_full_message:
+                await _notify_queue_full(guild_id, audio_queue, voice_client.guild, queue_full_message)
         else:
             logger.error(f"Competitive download failed for guild {guild_id}: {track_info.title}")
             
@@ -1034,8 +1148,6 @@ async def start_competitive_download(guild_id: int, track_info: TrackInfo, audio
 async def start_background_download(guild_id: int, track_info: TrackInfo, audio_queue: AudioQueue):
     """バックグラウンドでダウンロード開始"""
     try:
-        from ..youtube import YouTubeDownloader
-        
         # グローバルダウンロード状況をチェック
         global_status = YouTubeDownloader.get_download_status(track_info.url)
         
@@ -1045,24 +1157,8 @@ async def start_background_download(guild_id: int, track_info: TrackInfo, audio_
                 audio_queue.set_download_status(guild_id, track_info.url, True)
             return
         
-        downloader = YouTubeDownloader()
-        
-        # MP3をダウンロード（競合制御が実装済み）
-        download_result = await asyncio.get_event_loop().run_in_executor(
-            None, downloader.download_mp3, track_info.url
-        )
-        
-        # download_mp3は(bool, str)のタプルを返すため、成功可否のみを取得
-        if isinstance(download_result, tuple):
-            success, downloaded_title = download_result
-            # タイトルが取得できた場合は更新
-            if downloaded_title and downloaded_title != "Unknown Title":
-                track_info.title = downloaded_title
-        else:
-            # 後方互換性のため、boolが返された場合はそのまま使用
-            success = download_result
-        
-        if success:
+        # 再生用音声をダウンロード（競合制御が実装済み）
+        if await _download_track(track_info):
             audio_queue.set_download_status(guild_id, track_info.url, True)
             logger.info(f"Background download completed: {track_info.title}")
         else:
@@ -8,8 +8,18 @@ import discord
 from discord.ext import commands
 import logging
 
+from ..youtube import close_oembed_session
+
 logger = logging.getLogger(__name__)
 
+class YouTubeBot(commands.Bot):
+    """終了時にボット固有のリソースも解放するBot"""
+    
+    async def close(self):
+        """イベントループが止まる前にoEmbed用のHTTPセッションを閉じてから終了する"""
+        await close_oembed_session()
+        await super().close()
+
 def create_bot_instance(prefix: str):
     """ボットインスタンスを作成する"""
     # ボットの設定
@@ -20,7 +30,7 @@ def create_bot_instance(prefix: str):
     intents.voice_states = True
     
     # ボットの作成（スラッシュコマンド用）
-    bot = commands.Bot(command_prefix=prefix, intents=intents)
+    bot = YouTubeBot(command_prefix=prefix, intents=intents)
     
     logger.info(f"Bot instance created with prefix: {prefix}")
     return bot
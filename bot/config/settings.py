@@ -23,6 +23,18 @@ except ImportError:
     MAX_FILE_SIZE = 25
     SUPPORTED_QUALITIES = ['144p', '240p', '360p', '480p', '720p', '1080p']
 
+# 再生音量（1.0の場合はOpusファイルをFFmpegを介さずにそのまま再生する）
+if 'PLAYBACK_VOLUME' not in globals():
+    PLAYBACK_VOLUME = 0.25
+
+# 再生用音声キャッシュの容量上限（MB）
+if 'AUDIO_CACHE_MAX_MB' not in globals():
+    AUDIO_CACHE_MAX_MB = 500
+
+# ギルドごとのキューに追加できる最大曲数
+if 'MAX_QUEUE_SIZE' not in globals():
+    MAX_QUEUE_SIZE = 100
+
 def validate_settings():
     """設定値の検証"""
     if DISCORD_TOKEN == 'your_discord_bot_token_here':
@@ -41,5 +53,8 @@ def get_settings():
         'BOT_PREFIX': BOT_PREFIX,
         'DOWNLOAD_DIR': DOWNLOAD_DIR,
         'MAX_FILE_SIZE': MAX_FILE_SIZE,
-        'SUPPORTED_QUALITIES': SUPPORTED_QUALITIES
+        'SUPPORTED_QUALITIES': SUPPORTED_QUALITIES,
+        'PLAYBACK_VOLUME': PLAYBACK_VOLUME,
+        'AUDIO_CACHE_MAX_MB': AUDIO_CACHE_MAX_MB,
+        'MAX_QUEUE_SIZE': MAX_QUEUE_SIZE
     }
@@ -2,4 +2,5 @@
 
 from .encoding import *
 from .file_utils import *
+from .audio_cache import *
 from .subprocess_utils import *
@@ -0,0 +1,93 @@
+"""
+音声キャッシュ
+
+再生用に取得した音声を動画IDごとに保存し、容量上限を超えた分を古い順に削除する
+"""
+
+import os
+import logging
+from pathlib import Path
+from typing import Iterable, Optional
+
+from .file_utils import _is_file_protected
+
+logger = logging.getLogger(__name__)
+
+# キャッシュを保存するサブディレクトリ名
+AUDIO_CACHE_DIRNAME = "cache"
+
+def get_cache_dir(download_dir: str) -> Path:
+    """キャッシュディレクトリのパスを取得（存在しない場合は作成）"""
+    cache_dir = Path(download_dir) / AUDIO_CACHE_DIRNAME
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+def get_cached_audio(download_dir: str, video_id: str, ext: str = "opus") -> Optional[str]:
+    """
+    キャッシュ済みの音声ファイルを取得
+    
+    見つかった場合は最終利用時刻を更新する（LRU削除の順序に使用）
+    
+    Returns:
+        str: キャッシュファイルのパス、存在しない場合はNone
+    """
+    file_path = Path(download_dir) / AUDIO_CACHE_DIRNAME / f"{video_id}.{ext}"
+    try:
+        os.utime(file_path)
+    except FileNotFoundError:
+        return None
+    logger.info(f"Audio cache hit: {video_id}")
+    return str(file_path)
+
+def is_cached_audio(file_path: str) -> bool:
+    """キャッシュディレクトリ内のファイルかどうかを確認"""
+    if not file_path:
+        return False
+    return os.path.basename(os.path.dirname(file_path)) == AUDIO_CACHE_DIRNAME
+
+def enforce_cache_limit(download_dir: str, max_bytes: int, in_use: Iterable[str] = ()) -> int:
+    """
+    キャッシュの合計サイズが上限を超えている場合、最終利用が古いファイルから削除する
+    
+    Args:
+        download_dir: ダウンロードディレクトリ
+        max_bytes: キャッシュ容量の上限（バイト）
+        in_use: 再生中などで削除してはいけないファイルのパス
+    
+    Returns:
+        int: 削除したファイル数
+    """
+    cache_dir = Path(download_dir) / AUDIO_CACHE_DIRNAME
+    try:
+        with os.scandir(cache_dir) as it:
+            entries = [(entry.path, entry.stat()) for entry in it if entry.is_file()]
+    except FileNotFoundError:
+        return 0
+    
+    total_bytes = sum(stat.st_size for _, stat in entries)
+    if total_bytes <= max_bytes:
+        return 0
+    
+    skip_paths = {os.path.abspath(path) for path in in_use if path}
+    removed_count = 0
+    
+    # 最終利用時刻（mtime）が古い順に削除
+    for path, stat in sorted(entries, key=lambda item: item[1].st_mtime):
+        if total_bytes <= max_bytes:
+            break
+        if os.path.abspath(path) in skip_paths or _is_file_protected(path):
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Failed to evict cached audio {path}: {e}")
+            continue
+        total_bytes -= stat.st_size
+        removed_count += 1
+        logger.info(f"Evicted cached audio: {path}")
+    
+    if removed_count > 0:
+        logger.info(f"Audio cache trimmed: {removed_count} files removed, {total_bytes / (1024 * 1024):.1f} MB in use")
+    return removed_count
@@ -11,8 +11,21 @@ import platform
 
 logger = logging.getLogger(__name__)
 
+# setup_encodingを実行済みか（2回目以降の呼び出しでは何もしない）
+_encoding_configured = False
+
 def setup_encoding():
     """すべての環境でエンコーディング問題を回避する設定"""
+    global _encoding_configured
+    if _encoding_configured:
+        return
+    _encoding_configured = True
+    
+    # 標準出力が既にUTF-8の場合は再設定やlocale変更は不要
+    if (getattr(sys.stdout, 'encoding', None) or '').lower().replace('-', '') == 'utf8':
+        logger.debug("stdout is already UTF-8, skipping encoding setup")
+        return
+    
     try:
         # 環境変数を設定
         os.environ['PYTHONIOENCODING'] = 'utf-8'
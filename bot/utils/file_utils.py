@@ -8,16 +8,19 @@ import os
 import time
 import platform
 import gc
+import shutil
+import stat
+import tempfile
 import threading
 import asyncio
-from pathlib import Path
+from collections import deque
 import logging
 from typing import Optional
 
 logger = logging.getLogger(__name__)
 
 # バックグラウンド削除用のワーカー
-_deletion_queue = []
+_deletion_queue = deque()
 _deletion_lock = threading.Lock()
 _deletion_worker_running = False
 
@@ -25,24 +28,30 @@ _deletion_worker_running = False
 _protected_files = set()
 _protected_files_lock = threading.Lock()
 
+# ダウンロード済みファイルを登録順に追跡（期限切れ削除用）
+_download_registry = deque()  # (file_path, registered_at)
+_download_registry_lock = threading.Lock()
+
+# ボットが起動したFFmpegプロセス（guild_id -> subprocess.Popen）
+_ffmpeg_processes = {}
+_ffmpeg_processes_lock = threading.Lock()
+
 def cleanup_audio_file(file_path: str, guild_id: int = None, force_delete: bool = False):
     """音声ファイルを確実に削除するヘルパー関数（即座に返し、バックグラウンドで削除）"""
     try:
-        # ファイルが存在するか確認
-        if not os.path.exists(file_path):
-            logger.info(f"Audio file already removed: {file_path}")
-            return True
-        
         # force_deleteがFalseの場合、保護されたファイルかチェック
         if not force_delete and _is_file_protected(file_path):
             logger.info(f"🔒 Skipping deletion of protected file (loop/active): {file_path}")
             return True
         
-        # まずはシンプルに削除を試行
+        # まずはシンプルに削除を試行（存在確認は削除結果で判定する）
         try:
             os.remove(file_path)
             logger.info(f"✅ Cleaned up audio file: {file_path}")
             return True
+        except FileNotFoundError:
+            logger.info(f"Audio file already removed: {file_path}")
+            return True
         except PermissionError:
             # 削除できない場合はバックグラウンドキューに追加
             logger.info(f"Adding file to background deletion queue: {file_path}")
@@ -60,7 +69,7 @@ def protect_file(file_path: str):
     if file_path:
         with _protected_files_lock:
             _protected_files.add(os.path.abspath(file_path))
-            logger.debug(f"🔒 Protected file from deletion: {file_path}")
+            logger.debug("🔒 Protected file from deletion: %s", file_path)
 
 def unprotect_file(file_path: str):
     """ファイルの保護を解除する"""
@@ -68,7 +77,7 @@ def unprotect_file(file_path: str):
         with _protected_files_lock:
             abs_path = os.path.abspath(file_path)
             _protected_files.discard(abs_path)
-            logger.debug(f"🔓 Unprotected file: {file_path}")
+            logger.debug("🔓 Unprotected file: %s", file_path)
 
 def _is_file_protected(file_path: str) -> bool:
     """ファイルが保護されているかチェック"""
@@ -87,7 +96,7 @@ def _add_to_deletion_queue(file_path: str, guild_id: Optional[int] = None):
             'guild_id': guild_id,
             'added_at': time.time()
         })
-        logger.debug(f"Added to deletion queue: {file_path}")
+        logger.debug("Added to deletion queue: %s", file_path)
         
         # ワーカーが動いていない場合は開始
         if not _deletion_worker_running:
@@ -107,7 +116,7 @@ def _background_deletion_worker():
             file_item = None
             with _deletion_lock:
                 if _deletion_queue:
-                    file_item = _deletion_queue.pop(0)
+                    file_item = _deletion_queue.popleft()
                 else:
                     # キューが空の場合はワーカーを停止
                     _deletion_worker_running = False
@@ -133,18 +142,12 @@ def _attempt_background_deletion(file_item: dict):
     guild_id = file_item.get('guild_id')
     
     try:
-        # ファイルが存在するか確認
-        if not os.path.exists(file_path):
-            logger.info(f"Background: File already removed: {file_path}")
-            return True
-        
         # ガベージコレクションを実行
         gc.collect()
         
         # Windows特有の問題に対処
         if platform.system() == "Windows":
             try:
-                import stat
                 os.chmod(file_path, stat.S_IWRITE)
             except Exception:
                 pass
@@ -152,18 +155,17 @@ def _attempt_background_deletion(file_item: dict):
         # 段階的リトライ（最大5回、短い間隔）
         for retry_count in range(5):
             try:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    logger.info(f"✅ Background deleted audio file: {file_path}")
-                    return True
-                else:
-                    logger.info(f"Background: File already removed: {file_path}")
-                    return True
+                os.remove(file_path)
+                logger.info(f"✅ Background deleted audio file: {file_path}")
+                return True
+            except FileNotFoundError:
+                logger.info(f"Background: File already removed: {file_path}")
+                return True
             except PermissionError:
                 if retry_count < 4:
                     # 短い待機時間でリトライ
                     wait_time = (retry_count + 1) * 1  # 1, 2, 3, 4, 5秒
-                    logger.debug(f"Background retry {retry_count + 1} in {wait_time}s: {file_path}")
+                    logger.debug("Background retry %s in %ss: %s", retry_count + 1, wait_time, file_path)
                     time.sleep(wait_time)
                     gc.collect()
                 else:
@@ -185,9 +187,6 @@ def _attempt_background_deletion(file_item: dict):
 def _force_file_deletion(file_path: str) -> bool:
     """強制ファイル削除（最終手段）"""
     try:
-        import tempfile
-        import shutil
-        
         # 一時ディレクトリにファイルを移動してから削除
         temp_dir = tempfile.mkdtemp()
         temp_file = os.path.join(temp_dir, f"temp_{int(time.time())}.tmp")
@@ -243,27 +242,28 @@ def cleanup_old_audio_files(download_dir: str, max_age_hours: int = 1):
         pending_count = process_pending_deletions(download_dir)
         
         current_time = time.time()
-        # 指定時間以上古い音声ファイルを削除
-        cutoff_time = current_time - (max_age_hours * 3600)
-        
-        audio_files = list(Path(download_dir).glob("*.mp3"))
+        max_age_seconds = max_age_hours * 3600
         cleaned_count = 0
         
-        for file_path in audio_files:
+        # 指定時間以上古い音声ファイルを削除（scandirのstat結果を再利用する）
+        with os.scandir(download_dir) as it:
+            entries = [entry for entry in it if entry.name.endswith(('.mp3', '.opus')) and entry.is_file()]
+        
+        for entry in entries:
             try:
-                file_age = current_time - file_path.stat().st_mtime
-                if file_age > cutoff_time:
+                file_age = current_time - entry.stat().st_mtime
+                if file_age > max_age_seconds:
                     # 保護されたファイルはスキップ
-                    if _is_file_protected(str(file_path)):
-                        logger.info(f"🔒 Skipping cleanup of protected old file: {file_path}")
+                    if _is_file_protected(entry.path):
+                        logger.info(f"🔒 Skipping cleanup of protected old file: {entry.path}")
                         continue
                         
-                    success = cleanup_audio_file(str(file_path))
+                    success = cleanup_audio_file(entry.path)
                     if success:
                         cleaned_count += 1
-                        logger.info(f"Cleaned up old audio file: {file_path}")
+                        logger.info(f"Cleaned up old audio file: {entry.path}")
             except Exception as e:
-                logger.error(f"Failed to cleanup old file {file_path}: {e}")
+                logger.error(f"Failed to cleanup old file {entry.path}: {e}")
         
         total_cleaned = cleaned_count + pending_count
         if total_cleaned > 0:
@@ -277,22 +277,33 @@ def cleanup_old_audio_files(download_dir: str, max_age_hours: int = 1):
         logger.error(f"Failed to cleanup old audio files: {e}")
         return 0
 
+def register_ffmpeg_process(guild_id: int, process):
+    """ボットが起動したFFmpegプロセスをギルドごとに登録"""
+    if process is None:
+        return
+    with _ffmpeg_processes_lock:
+        _ffmpeg_processes[guild_id] = process
+
 def force_kill_ffmpeg_processes():
-    """残っているFFmpegプロセスを強制終了する関数"""
+    """ボットが起動したFFmpegプロセスのうち、残っているものを強制終了する関数"""
     try:
-        import psutil
+        with _ffmpeg_processes_lock:
+            processes = list(_ffmpeg_processes.items())
+            _ffmpeg_processes.clear()
         
         killed_count = 0
-        # FFmpegプロセスを検索して終了
-        for proc in psutil.process_iter(['pid', 'name']):
+        for guild_id, process in processes:
             try:
-                if 'ffmpeg' in proc.info['name'].lower():
-                    logger.warning(f"Force killing FFmpeg process: {proc.info['pid']}")
-                    proc.kill()
-                    killed_count += 1
-            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                pass
-                
+                # 既に終了しているプロセスはスキップ
+                if process.poll() is not None:
+                    continue
+                logger.warning(f"Force killing FFmpeg process: {process.pid} (guild {guild_id})")
+                process.kill()
+                process.wait(timeout=5)
+                killed_count += 1
+            except Exception as e:
+                logger.warning(f"Failed to kill FFmpeg process {process.pid}: {e}")
+        
         if killed_count > 0:
             logger.info(f"Killed {killed_count} FFmpeg processes")
         else:
@@ -300,9 +311,6 @@ def force_kill_ffmpeg_processes():
         
         return killed_count
         
-    except ImportError:
-        logger.warning("psutil not available, skipping FFmpeg process cleanup")
-        return 0
     except Exception as e:
         logger.error(f"Failed to cleanup FFmpeg processes: {e}")
         return 0
@@ -322,17 +330,16 @@ def process_pending_deletions(download_dir: str):
             file_paths = [line.strip() for line in f.readlines() if line.strip()]
         
         for file_path in file_paths:
-            if os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                    logger.info(f"✅ Deleted pending file: {file_path}")
-                    deleted_count += 1
-                except Exception as e:
-                    logger.warning(f"Still unable to delete: {file_path} - {e}")
-                    remaining_files.append(file_path)
-            else:
+            try:
+                os.remove(file_path)
+                logger.info(f"✅ Deleted pending file: {file_path}")
+                deleted_count += 1
+            except FileNotFoundError:
                 logger.info(f"Pending file already removed: {file_path}")
                 deleted_count += 1
+            except Exception as e:
+                logger.warning(f"Still unable to delete: {file_path} - {e}")
+                remaining_files.append(file_path)
         
         # 削除できなかったファイルがある場合、リストを更新
         if remaining_files:
@@ -357,32 +364,51 @@ def process_pending_deletions(download_dir: str):
         logger.error(f"Failed to process pending deletions: {e}")
         return 0
 
-def get_latest_audio_file(download_dir: str, extension: str = "mp3"):
-    """最新の音声ファイルを取得"""
-    try:
-        audio_files = list(Path(download_dir).glob(f"*.{extension}"))
-        if audio_files:
-            # 最新のファイルを取得（作成時刻順）
-            latest_file = max(audio_files, key=lambda x: x.stat().st_mtime)
-            return str(latest_file)
-        return None
-    except Exception as e:
-        logger.error(f"Failed to get latest audio file: {e}")
-        return None
+def register_download(file_path: str):
+    """ダウンロードしたファイルを期限切れ削除の対象として登録"""
+    if file_path:
+        with _download_registry_lock:
+            _download_registry.append((file_path, time.time()))
+        logger.debug("Registered downloaded file: %s", file_path)
+
+def sweep_expired_downloads(max_age_seconds: int = 3600):
+    """登録済みのダウンロードファイルのうち期限切れのものを削除する"""
+    cutoff_time = time.time() - max_age_seconds
+    expired_files = []
+    
+    # 登録順（=古い順）なので、先頭から期限切れのものだけを取り出す
+    with _download_registry_lock:
+        while _download_registry and _download_registry[0][1] < cutoff_time:
+            expired_files.append(_download_registry.popleft()[0])
+    
+    cleaned_count = 0
+    for file_path in expired_files:
+        # 保護されたファイル（ループ再生中など）は次回の確認まで延長
+        if _is_file_protected(file_path):
+            register_download(file_path)
+            continue
+        cleanup_audio_file(file_path)
+        cleaned_count += 1
+    
+    if cleaned_count > 0:
+        logger.info(f"Swept {cleaned_count} expired downloaded files")
+    return cleaned_count
 
 def validate_audio_file(file_path: str):
     """音声ファイルの妥当性をチェック"""
     try:
-        if not os.path.exists(file_path):
+        # 存在確認とサイズ取得を1回のstatで行う
+        try:
+            file_size = os.stat(file_path).st_size
+        except FileNotFoundError:
             logger.error(f"Audio file not found: {file_path}")
             return False
         
-        file_size = os.path.getsize(file_path)
         if file_size == 0:
             logger.error(f"Audio file is empty: {file_path}")
             return False
         
-        logger.debug(f"Audio file validated: {file_path} (size: {file_size} bytes)")
+        logger.debug("Audio file validated: %s (size: %s bytes)", file_path, file_size)
         return True
         
     except Exception as e:
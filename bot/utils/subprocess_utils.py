@@ -12,6 +12,8 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+_IS_WINDOWS = platform.system() == 'Windows'
+
 def safe_subprocess_run(*args, **kwargs):
     """
     クロスプラットフォーム対応の安全なsubprocess.run呼び出し
@@ -24,20 +26,16 @@ def safe_subprocess_run(*args, **kwargs):
         subprocess.CompletedProcess: 実行結果
     """
     try:
-        # 環境変数を設定
-        env = kwargs.get('env', os.environ.copy())
-        env['PYTHONIOENCODING'] = 'utf-8'
-        env['PYTHONUTF8'] = '1'
+        # 環境変数を設定（呼び出し元の指定がない場合は事前に作成した辞書を共有する）
+        if 'env' in kwargs:
+            env = dict(kwargs['env'])
+            env.update(_SUBPROCESS_ENV_OVERRIDES)
+        else:
+            env = _SUBPROCESS_ENV
         
         # Windows環境での追加設定
-        if platform.system() == 'Windows':
-            env['PYTHONLEGACYWINDOWSSTDIO'] = 'utf-8'
-            env['PYTHONLEGACYWINDOWSFSENCODING'] = 'utf-8'
-            # Windows用のstartupinfo設定
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-            startupinfo.wShowWindow = subprocess.SW_HIDE
-            kwargs['startupinfo'] = startupinfo
+        if _IS_WINDOWS:
+            kwargs['startupinfo'] = _STARTUPINFO
         
         kwargs['env'] = env
         
@@ -58,7 +56,7 @@ def safe_subprocess_run(*args, **kwargs):
                 kwargs['stderr'] = subprocess.PIPE
         
         # Windows環境での追加設定
-        if platform.system() == 'Windows':
+        if _IS_WINDOWS:
             # Windowsでは、より安全な設定を使用
             kwargs['text'] = True
             kwargs['universal_newlines'] = True
@@ -69,7 +67,7 @@ def safe_subprocess_run(*args, **kwargs):
             kwargs['timeout'] = 30
             
         result = subprocess.run(*args, **kwargs)
-        logger.debug(f"Subprocess completed with return code: {result.returncode}")
+        logger.debug("Subprocess completed with return code: %s", result.returncode)
         return result
         
     except subprocess.TimeoutExpired as e:
@@ -89,15 +87,26 @@ def safe_subprocess_run(*args, **kwargs):
 def get_subprocess_env():
     """サブプロセス用の環境変数辞書を取得"""
     env = os.environ.copy()
-    env.update({
-        'PYTHONIOENCODING': 'utf-8',
-        'PYTHONUTF8': '1'
-    })
-    
-    if platform.system() == 'Windows':
-        env.update({
-            'PYTHONLEGACYWINDOWSSTDIO': 'utf-8',
-            'PYTHONLEGACYWINDOWSFSENCODING': 'utf-8'
-        })
-    
+    env.update(_SUBPROCESS_ENV_OVERRIDES)
     return env
+
+# サブプロセスに設定する環境変数
+_SUBPROCESS_ENV_OVERRIDES = {
+    'PYTHONIOENCODING': 'utf-8',
+    'PYTHONUTF8': '1'
+}
+if _IS_WINDOWS:
+    _SUBPROCESS_ENV_OVERRIDES.update({
+        'PYTHONLEGACYWINDOWSSTDIO': 'utf-8',
+        'PYTHONLEGACYWINDOWSFSENCODING': 'utf-8'
+    })
+
+# 呼び出しごとにos.environをコピーしないよう、起動時の環境変数から一度だけ作成する
+_SUBPROCESS_ENV = get_subprocess_env()
+
+# Windowsでコンソールウィンドウを表示しないためのstartupinfo
+_STARTUPINFO = None
+if _IS_WINDOWS:
+    _STARTUPINFO = subprocess.STARTUPINFO()
+    _STARTUPINFO.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    _STARTUPINFO.wShowWindow = subprocess.SW_HIDE
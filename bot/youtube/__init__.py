@@ -1,4 +1,4 @@
 """YouTube処理モジュール"""
 
-from .downloader import YouTubeDownloader
-from .url_handler import normalize_youtube_url, get_title_from_url, generate_title_from_url, validate_youtube_url, is_playlist_url
+from .downloader import YouTubeDownloader, run_download, download_executor, shutdown_download_executor, fetch_oembed_title, close_oembed_session
+from .url_handler import normalize_youtube_url, generate_title_from_url, validate_youtube_url, is_playlist_url, extract_video_id
@@ -6,59 +6,171 @@ YouTube動画とMP3のダウンロード機能を統合
 
 import sys
 import os
+import asyncio
 import logging
 import re
+import shutil
 import subprocess
 import threading
 import time
+import aiohttp
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Optional
 from ..utils.subprocess_utils import safe_subprocess_run
+from ..utils.file_utils import register_download
+from ..utils.audio_cache import get_cache_dir, get_cached_audio
+from .url_handler import extract_video_id, generate_title_from_url, validate_youtube_url
 
 logger = logging.getLogger(__name__)
 
+# 再生用音声の形式（Discordへそのまま送れるOpusで保存する）
+PLAYBACK_AUDIO_FORMAT = 'opus'
+PLAYBACK_AUDIO_QUALITY = '128K'
+
+# ダウンロード専用のスレッドプール
+# （同時に起動するyt-dlpの数を制限し、帯域とCPUの奪い合いで全件が遅くなるのを防ぐ）
+# 環境変数DOWNLOAD_POOL_SIZEで同時ダウンロード数を変更できる
+try:
+    MAX_CONCURRENT_DOWNLOADS = max(1, int(os.environ.get('DOWNLOAD_POOL_SIZE', '4')))
+except ValueError:
+    MAX_CONCURRENT_DOWNLOADS = 4
+download_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_DOWNLOADS, thread_name_prefix="ytdl")
+
+async def run_download(func, *args):
+    """ダウンロード処理をダウンロード専用のスレッドプールで実行"""
+    return await asyncio.get_running_loop().run_in_executor(download_executor, func, *args)
+
+def shutdown_download_executor():
+    """ダウンロード用スレッドプールを終了（実行中のダウンロードの完了を待つ）"""
+    logger.info("Shutting down download executor...")
+    download_executor.shutdown(wait=True)
+
+# タイトル取得に使うoEmbedエンドポイント（yt-dlpを起動せずにHTTPリクエスト1回で取得できる）
+OEMBED_URL = 'https://www.youtube.com/oembed'
+OEMBED_TIMEOUT = 3  # 秒
+
+_oembed_session: Optional[aiohttp.ClientSession] = None
+
+async def fetch_oembed_title(url: str) -> Optional[str]:
+    """
+    oEmbedで動画タイトルを取得
+    
+    Returns:
+        str: 動画タイトル、取得できない場合はNone
+    """
+    global _oembed_session
+    if _oembed_session is None or _oembed_session.closed:
+        _oembed_session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=OEMBED_TIMEOUT))
+    
+    try:
+        async with _oembed_session.get(OEMBED_URL, params={'url': url, 'format': 'json'}) as response:
+            if response.status != 200:
+                logger.debug("oEmbed returned status %s for %s", response.status, url)
+                return None
+            data = await response.json(content_type=None)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        logger.debug("oEmbed request failed for %s: %s", url, e)
+        return None
+    
+    title = data.get('title') if isinstance(data, dict) else None
+    return title or None
+
+async def close_oembed_session():
+    """oEmbed用のHTTPセッションを閉じる"""
+    global _oembed_session
+    if _oembed_session is not None and not _oembed_session.closed:
+        await _oembed_session.close()
+    _oembed_session = None
+
+# ダウンロード・ストリーム取得時のyt-dlpの通信設定
+# （制限を受けた際に同じリクエストを再試行して状況を悪化させないよう再試行せず、IPv4に固定する。
+#  再生時はストリームURLの取得に失敗してもダウンロードでもう一度試行する）
+YTDLP_NETWORK_ARGS = [
+    '--retries', '0',
+    '--fragment-retries', '0',
+    '--extractor-retries', '0',
+    '--force-ipv4',
+]
+
+# aria2cが利用可能な場合に使う外部ダウンローダーの引数
+# （1ファイルを4接続・1MB単位の分割で並列取得する）
+ARIA2C_ARGS = 'aria2c:-x 4 -s 4 -k 1M'
+
+# 動画タイトルのキャッシュ設定（同じ動画の再リクエストでyt-dlpを起動しない）
+TITLE_CACHE_TTL = 24 * 3600  # 秒
+TITLE_CACHE_MAX_ENTRIES = 1000
+
 class YouTubeDownloader:
     """YouTube動画/音声ダウンローダー（統合版）"""
     
     # クラス変数でダウンロード状況を管理
     _download_locks = {}
     _download_status = {}
+    _download_results = {}  # url_key -> (title, file_path)
+    _yt_dlp_path = None  # 検出済みのyt-dlpパス
+    _aria2c_path = None  # 検出済みのaria2cパス（未検出の場合は空文字）
+    _prepared_dirs = set()  # 作成済みのダウンロードディレクトリ
+    _title_cache = OrderedDict()  # 動画ID（取得できない場合はURL） -> (タイトル, 取得時刻)
     _lock = threading.Lock()
+    # タイトルキャッシュはイベントループから参照されるため、ダウンロード管理とは別のロックで保護する
+    _title_lock = threading.Lock()
     
     def __init__(self, download_dir: str = "./downloads"):
         self.download_dir = download_dir
-        Path(download_dir).mkdir(exist_ok=True)
         self.yt_dlp_path = None
-        logger.info(f"YouTube downloader initialized with directory: {download_dir}")
+        
+        # インスタンスはイベントループ上で頻繁に作成されるため、
+        # ディレクトリ作成のファイルシステム操作はディレクトリごとに一度だけ行う
+        if download_dir not in YouTubeDownloader._prepared_dirs:
+            Path(download_dir).mkdir(exist_ok=True)
+            YouTubeDownloader._prepared_dirs.add(download_dir)
+            logger.info(f"YouTube downloader initialized with directory: {download_dir}")
     
     def check_yt_dlp(self) -> bool:
         """
         yt-dlpがインストールされているかチェック
         
+        環境変数 YT_DLP_PATH、またはPATH上のyt-dlpを使用する。
+        検出結果はクラス全体でキャッシュする。
+        
         Returns:
             bool: yt-dlpが利用可能な場合True
         """
-        # yt-dlpのパスを探す
-        yt_dlp_paths = [
-            'yt-dlp',  # PATHにある場合
-            '/Users/natuki/Library/Python/3.9/bin/yt-dlp',  # macOSの一般的なパス
-            '/usr/local/bin/yt-dlp',  # Homebrewのパス
-            '/opt/homebrew/bin/yt-dlp'  # Apple Silicon MacのHomebrewパス
-        ]
+        if YouTubeDownloader._yt_dlp_path is None:
+            path = os.environ.get('YT_DLP_PATH') or shutil.which('yt-dlp')
+            if not path or not os.access(path, os.X_OK):
+                logger.error("yt-dlpがインストールされていません（PATHまたはYT_DLP_PATHを確認してください）")
+                return False
+            logger.info(f"yt-dlp を検出: {path}")
+            YouTubeDownloader._yt_dlp_path = path
+        
+        self.yt_dlp_path = YouTubeDownloader._yt_dlp_path
+        return True
+    
+    def _external_downloader_args(self) -> list:
+        """
+        aria2cがインストールされている場合に外部ダウンローダーとして使う引数を取得
+        
+        検出結果はクラス全体でキャッシュする。
         
-        for path in yt_dlp_paths:
-            try:
-                result = safe_subprocess_run([path, '--version'], capture_output=True, text=True)
-                if result and result.returncode == 0:
-                    logger.info(f"yt-dlp バージョン: {result.stdout.strip()}")
-                    self.yt_dlp_path = path
-                    return True
-            except Exception:
-                continue
+        Returns:
+            list: yt-dlpに追加する引数（aria2cがない場合は空）
+        """
+        if YouTubeDownloader._aria2c_path is None:
+            YouTubeDownloader._aria2c_path = shutil.which('aria2c') or ''
+            if YouTubeDownloader._aria2c_path:
+                logger.info(f"aria2c を検出: {YouTubeDownloader._aria2c_path}")
         
-        logger.error("yt-dlpがインストールされていません")
-        return False
+        if not YouTubeDownloader._aria2c_path:
+            return []
+        return [
+            '--downloader', YouTubeDownloader._aria2c_path,
+            '--downloader-args', ARIA2C_ARGS,
+        ]
     
-    def download_video(self, url: str, quality: str = "720p", format_id: str = None) -> bool:
+    def download_video(self, url: str, quality: str = "720p", format_id: str = None) -> tuple:
         """
         YouTube動画をダウンロード
         
@@ -68,11 +180,11 @@ class YouTubeDownloader:
             format_id: 特定の形式ID（オプション）
             
         Returns:
-            bool: ダウンロード成功可否
+            tuple: (bool, str) - (ダウンロード成功可否, 出力ファイルパス)
         """
         try:
             if not self.check_yt_dlp():
-                return False
+                return False, None
             
             logger.info(f"Starting video download: {url} ({quality})")
             
@@ -89,26 +201,34 @@ class YouTubeDownloader:
             
             cmd = [
                 self.yt_dlp_path,
+                *YTDLP_NETWORK_ARGS,
                 '--format', format_spec,
                 '--output', output_template,
                 '--no-playlist',
                 '--merge-output-format', 'mp4',
+                '--print', 'after_move:filepath',  # 出力ファイルパスを標準出力に表示
+                *self._external_downloader_args(),
                 url
             ]
             
             result = safe_subprocess_run(cmd, capture_output=True, text=True, timeout=300)
             
             if result and result.returncode == 0:
-                logger.info(f"Video download completed: {url}")
-                return True
+                file_path = self._parse_output_filepath(result.stdout)
+                if not file_path:
+                    logger.error(f"Video download finished but output path is unknown: {url}")
+                    return False, None
+                register_download(file_path)
+                logger.info(f"Video download completed: {url} -> {file_path}")
+                return True, file_path
             else:
                 error_msg = result.stderr if result and result.stderr else "Unknown error"
                 logger.error(f"Video download failed: {error_msg}")
-                return False
+                return False, None
             
         except Exception as e:
             logger.error(f"Video download error: {e}")
-            return False
+            return False, None
     
     def download_mp3(self, url: str, quality: str = "320") -> tuple:
         """
@@ -119,65 +239,124 @@ class YouTubeDownloader:
             quality: MP3音質（kbps）
             
         Returns:
-            tuple: (bool, str) - (ダウンロード成功可否, 動画タイトル)
+            tuple: (bool, str, str) - (ダウンロード成功可否, 動画タイトル, 出力ファイルパス)
+        """
+        return self._download_audio(url, 'mp3', quality)
+    
+    def download_audio(self, url: str) -> tuple:
         """
+        再生用の音声をOpus形式でダウンロード
+        
+        元の音声がOpusの場合は再エンコードせずに取り出されるため、
+        再生時にPCMへのデコードとOpusへの再エンコードを省略できる。
+        動画IDごとにキャッシュし、キャッシュ済みの場合はダウンロードしない
+        
+        Args:
+            url: YouTube URL
+            
+        Returns:
+            tuple: (bool, str, str) - (ダウンロード成功可否, 動画タイトル, 出力ファイルパス)
+        """
+        video_id = extract_video_id(url)
+        if not video_id:
+            return self._download_audio(url, PLAYBACK_AUDIO_FORMAT, PLAYBACK_AUDIO_QUALITY)
+        
+        cached_path = get_cached_audio(self.download_dir, video_id, PLAYBACK_AUDIO_FORMAT)
+        if cached_path:
+            # タイトルがキャッシュにない場合は呼び出し元で取得済みのものを使用する
+            return True, self._get_cached_title(url) or "Unknown Title", cached_path
+        
+        # キャッシュファイルは容量上限で管理するため期限切れ削除の対象にしない
+        output_template = str(get_cache_dir(self.download_dir) / "%(id)s.%(ext)s")
+        return self._download_audio(
+            url, PLAYBACK_AUDIO_FORMAT, PLAYBACK_AUDIO_QUALITY, output_template, register=False
+        )
+    
+    def _download_audio(self, url: str, audio_format: str, quality: str,
+                        output_template: str = None, register: bool = True) -> tuple:
+        """指定形式で音声を抽出してダウンロード"""
         try:
             if not self.check_yt_dlp():
-                return False, "Unknown Title"
+                return False, "Unknown Title", None
             
-            # URLのハッシュをキーとして使用
-            url_key = str(hash(url))
+            # URLと形式のハッシュをキーとして使用
+            url_key = self._get_url_key(url, audio_format)
             
             # ダウンロード競合をチェック
+            wait_for_other = False
             with self._lock:
-                if url_key in self._download_status:
-                    status = self._download_status[url_key]
-                    if status == 'downloading':
-                        logger.info(f"URL already being downloaded, waiting: {url}")
-                        # 他のダウンロードの完了を待つ
-                        return self._wait_for_download_completion(url_key, url)
-                    elif status == 'completed':
-                        logger.info(f"URL already downloaded: {url}")
-                        return True, self.get_video_title(url)
-                
-                # ダウンロード開始をマーク
-                self._download_status[url_key] = 'downloading'
-                self._download_locks[url_key] = threading.Event()
+                status = self._download_status.get(url_key)
+                if status == 'downloading':
+                    wait_for_other = True
+                else:
+                    if status == 'completed':
+                        title, file_path = self._download_results.get(url_key, (None, None))
+                        # 再生後に削除されている場合は再ダウンロードする
+                        if file_path and os.path.exists(file_path):
+                            logger.info(f"URL already downloaded: {url}")
+                            return True, title, file_path
+                    
+                    # ダウンロード開始をマーク
+                    self._download_status[url_key] = 'downloading'
+                    self._download_locks[url_key] = threading.Event()
             
-            logger.info(f"Starting MP3 download: {url} ({quality}kbps)")
+            if wait_for_other:
+                logger.info(f"URL already being downloaded, waiting: {url}")
+                # 他のダウンロードの完了を待つ（完了側が_lockを取得できるようロックの外で待機する）
+                return self._wait_for_download_completion(url_key, url)
             
-            # まずタイトルを取得
-            video_title = self.get_video_title(url)
+            logger.info(f"Starting {audio_format} download: {url} ({quality})")
             
             # 出力ファイル名のテンプレート
-            output_template = str(Path(self.download_dir) / "%(title).50s [%(id)s].%(ext)s")
+            if output_template is None:
+                output_template = str(Path(self.download_dir) / "%(title).50s [%(id)s].%(ext)s")
             
             cmd = [
                 self.yt_dlp_path,
+                *YTDLP_NETWORK_ARGS,
                 '--extract-audio',
-                '--audio-format', 'mp3',
+                '--audio-format', audio_format,
                 '--audio-quality', quality,
-                '--embed-thumbnail',
                 '--output', output_template,
                 '--no-playlist',
-                '--write-info-json',  # 情報ファイルも出力
                 '--no-mtime',  # ファイルタイムスタンプを変更しない
-                url
+                # タイトルと変換後の出力ファイルパスを標準出力に表示
+                # （タイトル取得のためにyt-dlpを別途起動しない）
+                '--print', 'after_move:title',
+                '--print', 'after_move:filepath',
+                *self._external_downloader_args(),
             ]
+            if audio_format == 'mp3':
+                # 保存用のMP3にはサムネイルと情報ファイルも付与
+                cmd.extend(['--embed-thumbnail', '--write-info-json'])
+            cmd.append(url)
             
             result = safe_subprocess_run(cmd, capture_output=True, text=True, timeout=300)
             
-            success = result and result.returncode == 0
+            file_path = None
+            video_title = None
+            if result and result.returncode == 0:
+                file_path = self._parse_output_filepath(result.stdout)
+                video_title = self._parse_output_title(result.stdout)
+            success = file_path is not None
+            
+            if video_title:
+                self._cache_title(url, video_title)
+            else:
+                video_title = self._get_cached_title(url) or "Unknown Title"
             
             # ダウンロード状況を更新
             with self._lock:
                 if success:
                     self._download_status[url_key] = 'completed'
-                    logger.info(f"MP3 download completed: {video_title}")
+                    self._download_results[url_key] = (video_title, file_path)
+                    if register:
+                        register_download(file_path)
+                    logger.info(f"{audio_format} download completed: {video_title} -> {file_path}")
                 else:
                     self._download_status[url_key] = 'failed'
                     error_msg = result.stderr if result and result.stderr else "Unknown error"
-                    logger.error(f"MP3 download failed: {error_msg}")
+                    logger.error(f"{audio_format} download failed: {error_msg}")
                 
                 # 待機中のスレッドに通知
                 if url_key in self._download_locks:
@@ -190,22 +369,137 @@ class YouTubeDownloader:
                     with self._lock:
                         if url_key in self._download_locks:
                             del self._download_locks[url_key]
-                            logger.debug(f"Cleaned up download lock for {url_key}")
+                            logger.debug("Cleaned up download lock for %s", url_key)
                 
                 cleanup_thread = threading.Thread(target=cleanup_locks, daemon=True)
                 cleanup_thread.start()
             
-            return success, video_title
+            return success, video_title, file_path
             
         except Exception as e:
-            logger.error(f"MP3 download error: {e}")
+            logger.error(f"{audio_format} download error: {e}")
             # エラー時も状況をクリーンアップ
             with self._lock:
                 if url_key in self._download_status:
                     self._download_status[url_key] = 'failed'
                 if url_key in self._download_locks:
                     self._download_locks[url_key].set()
-            return False, "Unknown Title"
+            return False, "Unknown Title", None
+    
+    def get_stream_url(self, url: str) -> tuple:
+        """
+        ストリーミング再生用の音声URLを取得
+        
+        Args:
+            url: YouTube URL
+            
+        Returns:
+            tuple: (bool, str, str) - (取得成功可否, 動画タイトル, 音声URL)
+        """
+        try:
+            if not self.check_yt_dlp():
+                return False, "Unknown Title", None
+            
+            cmd = [
+                self.yt_dlp_path,
+                *YTDLP_NETWORK_ARGS,
+                '--format', 'bestaudio',
+                '--no-playlist',
+                '--print', 'title',
+                '--print', 'urls',
+                url
+            ]
+            
+            result = safe_subprocess_run(cmd, capture_output=True, text=True, timeout=30)
+            
+            if result and result.returncode == 0 and result.stdout:
+                lines = [line.strip() for line in result.stdout.splitlines() if line.strip()]
+                if len(lines) >= 2 and lines[-1].startswith('http'):
+                    logger.info(f"Retrieved stream URL: {lines[0]}")
+                    self._cache_title(url, lines[0])
+                    return True, lines[0], lines[-1]
+            
+            error_msg = result.stderr if result and result.stderr else "Unknown error"
+            logger.warning(f"Failed to get stream URL: {error_msg}")
+            return False, "Unknown Title", None
+            
+        except Exception as e:
+            logger.error(f"Stream URL retrieval error: {e}")
+            return False, "Unknown Title", None
+    
+    @staticmethod
+    def _get_url_key(url: str, audio_format: str) -> str:
+        """ダウンロード状況管理用のキーを生成"""
+        return f"{audio_format}_{hash(url)}"
+    
+    def _parse_output_filepath(self, stdout: str) -> str:
+        """yt-dlpの--print出力から出力ファイルパスを取得"""
+        if not stdout:
+            return None
+        lines = [line.strip() for line in stdout.splitlines() if line.strip()]
+        if not lines:
+            return None
+        file_path = lines[-1]
+        return file_path if os.path.exists(file_path) else None
+    
+    @classmethod
+    def _get_cached_title(cls, url: str) -> str:
+        """キャッシュ済みの動画タイトルを取得（期限切れ・未取得の場合はNone）"""
+        key = extract_video_id(url) or url
+        with cls._title_lock:
+            entry = cls._title_cache.get(key)
+            if entry is None:
+                return None
+            title, cached_at = entry
+            if time.time() - cached_at > TITLE_CACHE_TTL:
+                del cls._title_cache[key]
+                return None
+            cls._title_cache.move_to_end(key)
+            return title
+    
+    @classmethod
+    def _cache_title(cls, url: str, title: str):
+        """動画タイトルをキャッシュ（上限を超えた場合は最も古く使われたものから破棄）"""
+        key = extract_video_id(url) or url
+        with cls._title_lock:
+            cls._title_cache[key] = (title, time.time())
+            cls._title_cache.move_to_end(key)
+            while len(cls._title_cache) > TITLE_CACHE_MAX_ENTRIES:
+                cls._title_cache.popitem(last=False)
+    
+    @staticmethod
+    def _parse_output_title(stdout: str) -> str:
+        """yt-dlpの--print出力（タイトル、出力ファイルパスの順）からタイトルを取得"""
+        if not stdout:
+            return None
+        lines = [line.strip() for line in stdout.splitlines() if line.strip()]
+        return lines[-2] if len(lines) >= 2 else None
+    
+    async def get_video_title_async(self, url: str) -> str:
+        """
+        YouTube URLからタイトルを取得（イベントループ上から使用）
+        
+        キャッシュ、oEmbedの順に確認し、どちらでも取得できない場合のみ
+        yt-dlpをスレッドプールで実行する
+        
+        Args:
+            url: YouTube URL
+            
+        Returns:
+            str: 動画タイトル、失敗時は生成されたタイトル
+        """
+        cached_title = self._get_cached_title(url)
+        if cached_title:
+            logger.debug("Video title cache hit: %s", cached_title)
+            return cached_title
+        
+        title = await fetch_oembed_title(url)
+        if title:
+            logger.info(f"Retrieved video title via oEmbed: {title}")
+            self._cache_title(url, title)
+            return title
+        
+        return await asyncio.get_running_loop().run_in_executor(None, self.get_video_title, url)
     
     def get_video_title(self, url: str) -> str:
         """
@@ -218,8 +512,13 @@ class YouTubeDownloader:
             str: 動画タイトル、失敗時は生成されたタイトル
         """
         try:
+            cached_title = self._get_cached_title(url)
+            if cached_title:
+                logger.debug("Video title cache hit: %s", cached_title)
+                return cached_title
+            
             if not self.check_yt_dlp():
-                return self._generate_title_from_url(url)
+                return generate_title_from_url(url)
             
             # タイトル取得コマンドを実行
             title_cmd = [
@@ -234,66 +533,21 @@ class YouTubeDownloader:
             if result and result.returncode == 0 and result.stdout and result.stdout.strip():
                 title = result.stdout.strip()
                 logger.info(f"Retrieved video title: {title}")
+                self._cache_title(url, title)
                 return title
             else:
                 logger.warning("Could not retrieve video title, using fallback")
-                return self._generate_title_from_url(url)
+                return generate_title_from_url(url)
                 
         except Exception as e:
             logger.warning(f"Title retrieval error: {e}")
-            return self._generate_title_from_url(url)
-    
-    def _generate_title_from_url(self, url: str) -> str:
-        """URLから動画タイトルを生成"""
-        try:
-            if 'youtube.com/watch?v=' in url:
-                video_id = url.split('v=')[1].split('&')[0]
-                return f"YouTube動画 (ID: {video_id})"
-            elif 'youtu.be/' in url:
-                video_id = url.split('youtu.be/')[1].split('?')[0]
-                return f"YouTube動画 (ID: {video_id})"
-            else:
-                return "YouTube動画（タイトル取得不可）"
-        except Exception:
-            return "YouTube動画（タイトル取得不可）"
-    
-    def get_latest_video_file(self) -> str:
-        """最新の動画ファイルを取得"""
-        try:
-            video_files = list(Path(self.download_dir).glob("*.mp4"))
-            if video_files:
-                latest_file = max(video_files, key=lambda x: x.stat().st_mtime)
-                return str(latest_file)
-            return None
-        except Exception as e:
-            logger.error(f"Failed to get latest video file: {e}")
-            return None
-    
-    def get_latest_mp3_file(self) -> str:
-        """最新のMP3ファイルを取得"""
-        try:
-            mp3_files = list(Path(self.download_dir).glob("**/*.mp3"))  # 再帰検索
-            logger.debug(f"Found {len(mp3_files)} MP3 files in {self.download_dir}")
-            for file in mp3_files:
-                logger.debug(f"  - {file}")
-            
-            if mp3_files:
-                latest_file = max(mp3_files, key=lambda x: x.stat().st_mtime)
-                logger.info(f"Latest MP3 file: {latest_file}")
-                return str(latest_file)
-            else:
-                logger.warning(f"No MP3 files found in {self.download_dir}")
-            return None
-        except Exception as e:
-            logger.error(f"Failed to get latest MP3 file: {e}")
-            return None
+            return generate_title_from_url(url)
     
     def get_file_size_mb(self, file_path: str) -> float:
         """ファイルサイズをMBで取得"""
         try:
-            if os.path.exists(file_path):
-                size_bytes = os.path.getsize(file_path)
-                return size_bytes / (1024 * 1024)
+            return os.stat(file_path).st_size / (1024 * 1024)
+        except FileNotFoundError:
             return 0.0
         except Exception as e:
             logger.error(f"Failed to get file size for {file_path}: {e}")
@@ -302,10 +556,10 @@ class YouTubeDownloader:
     def cleanup_file(self, file_path: str) -> bool:
         """ファイルを削除"""
         try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                logger.info(f"Cleaned up file: {file_path}")
-                return True
+            os.remove(file_path)
+            logger.info(f"Cleaned up file: {file_path}")
+            return True
+        except FileNotFoundError:
             return True  # ファイルが存在しない場合も成功とする
         except Exception as e:
             logger.error(f"Failed to cleanup file {file_path}: {e}")
@@ -333,6 +587,7 @@ class YouTubeDownloader:
             
             cmd = [
                 self.yt_dlp_path,
+                *YTDLP_NETWORK_ARGS,
                 '--extract-audio',
                 '--audio-format', 'mp3',
                 '--audio-quality', quality,
@@ -396,68 +651,90 @@ class YouTubeDownloader:
             url: 元のURL
             
         Returns:
-            tuple: (bool, str) - (ダウンロード成功可否, 動画タイトル)
+            tuple: (bool, str, str) - (ダウンロード成功可否, 動画タイトル, 出力ファイルパス)
         """
         try:
             # 最大90秒待機（より長い動画に対応）
-            if url_key in self._download_locks:
-                event = self._download_locks[url_key]
+            with self._lock:
+                event = self._download_locks.get(url_key)
+            if event is not None:
                 # 10秒間隔でステータスをチェック
                 for i in range(9):  # 90秒 / 10秒 = 9回
                     if event.wait(timeout=10):
                         # ダウンロード完了、結果を確認
-                        status = self._download_status.get(url_key, 'failed')
+                        with self._lock:
+                            status = self._download_status.get(url_key, 'failed')
+                            title, file_path = self._download_results.get(url_key, (None, None))
                         if status == 'completed':
                             logger.info(f"Download completed successfully: {url}")
-                            return True, self.get_video_title(url)
+                            return True, title or self.get_video_title(url), file_path
                         else:
                             logger.warning(f"Download failed: {url}")
-                            return False, "Download failed"
+                            return False, "Download failed", None
                     else:
-                        logger.debug(f"Still waiting for download... ({(i+1)*10}s elapsed)")
+                        logger.debug("Still waiting for download... (%ss elapsed)", (i+1)*10)
                 
                 logger.warning(f"Download timeout for URL after 90s: {url}")
-                return False, "Download timeout"
+                return False, "Download timeout", None
             else:
                 logger.error(f"Download lock not found for URL: {url}")
-                return False, "Download status unknown"
+                return False, "Download status unknown", None
         except Exception as e:
             logger.error(f"Error waiting for download completion: {e}")
-            return False, "Wait error"
+            return False, "Wait error", None
     
-    def cleanup_download_status(self, url: str):
+    def cleanup_download_status(self, url: str, audio_format: str = PLAYBACK_AUDIO_FORMAT):
         """
         指定されたURLのダウンロード状況をクリーンアップ
         
         Args:
             url: YouTube URL
+            audio_format: 音声形式
         """
         try:
-            url_key = str(hash(url))
+            url_key = self._get_url_key(url, audio_format)
             with self._lock:
                 if url_key in self._download_status:
                     del self._download_status[url_key]
                 if url_key in self._download_locks:
                     del self._download_locks[url_key]
-            logger.debug(f"Cleaned up download status for URL: {url}")
+                self._download_results.pop(url_key, None)
+            logger.debug("Cleaned up download status for URL: %s", url)
         except Exception as e:
             logger.error(f"Error cleaning up download status: {e}")
     
     @classmethod
-    def get_download_status(cls, url: str) -> str:
+    def get_download_status(cls, url: str, audio_format: str = PLAYBACK_AUDIO_FORMAT) -> str:
         """
         URLのダウンロード状況を取得
         
         Args:
             url: YouTube URL
+            audio_format: 音声形式
             
         Returns:
             str: ダウンロード状況 ('downloading', 'completed', 'failed', 'none')
         """
-        url_key = str(hash(url))
+        url_key = cls._get_url_key(url, audio_format)
         with cls._lock:
             return cls._download_status.get(url_key, 'none')
     
+    @classmethod
+    def get_downloaded_file(cls, url: str, audio_format: str = PLAYBACK_AUDIO_FORMAT) -> str:
+        """
+        ダウンロード済みURLの出力ファイルパスを取得
+        
+        Args:
+            url: YouTube URL
+            audio_format: 音声形式
+            
+        Returns:
+            str: 出力ファイルパス、未ダウンロードの場合None
+        """
+        url_key = cls._get_url_key(url, audio_format)
+        with cls._lock:
+            return cls._download_results.get(url_key, (None, None))[1]
+    
     def validate_youtube_url(self, url: str) -> bool:
         """
         YouTube URLの妥当性をチェック
@@ -468,14 +745,4 @@ class YouTubeDownloader:
         Returns:
             bool: 有効なYouTube URLかどうか
         """
-        youtube_patterns = [
-            'https://www.youtube.com/watch',
-            'https://youtube.com/watch', 
-            'https://youtu.be/',
-            'https://www.youtube.com/embed/',
-            'https://youtube.com/embed/',
-            'https://www.youtube.com/playlist',
-            'https://youtube.com/playlist'
-        ]
-        
-        return any(url.startswith(pattern) for pattern in youtube_patterns)
+        return validate_youtube_url(url)
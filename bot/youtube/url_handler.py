@@ -1,15 +1,43 @@
 """
 YouTube URL処理
 
-URL正規化とタイトル取得機能
+URL正規化と動画IDの抽出
 """
 
 import logging
-import platform
-from ..utils.subprocess_utils import safe_subprocess_run
+import re
+from typing import Optional
 
 logger = logging.getLogger(__name__)
 
+# 対応するYouTube URL（www./m./music. サブドメイン、shorts・埋め込み・プレイリストを含む）
+# 従来どおりhttpsのURLのみ受け付ける
+_YOUTUBE_URL_RE = re.compile(
+    r'https://(?:(?:www|m|music)\.)?youtube\.com/(?:watch|embed/|shorts/|playlist)'
+    r'|https://youtu\.be/'
+)
+
+# 動画IDの抽出（watch?v= / youtu.be / embed / shorts）
+_VIDEO_ID_RE = re.compile(
+    r'(?:[?&]v=|youtu\.be/|/embed/|/shorts/)([A-Za-z0-9_-]{11})'
+)
+
+# プレイリストの指定（playlist?list= / watch?v=...&list=）
+_PLAYLIST_RE = re.compile(r'[?&]list=')
+
+def extract_video_id(url: str) -> Optional[str]:
+    """
+    YouTube URLから動画IDを抽出する
+    
+    Args:
+        url (str): YouTube URL
+        
+    Returns:
+        str: 動画ID、抽出できない場合はNone
+    """
+    match = _VIDEO_ID_RE.search(url)
+    return match.group(1) if match else None
+
 def normalize_youtube_url(url: str) -> str:
     """
     YouTube URLを標準形式に正規化する
@@ -21,17 +49,12 @@ def normalize_youtube_url(url: str) -> str:
         str: 正規化されたURL、無効な場合はNone
     """
     try:
-        # youtu.be形式を標準形式に変換
-        if 'youtu.be/' in url:
-            video_id = url.split('youtu.be/')[-1].split('?')[0]
+        # youtu.be・埋め込み・shorts・watch形式を標準形式に変換
+        video_id = extract_video_id(url)
+        if video_id:
             return f"https://www.youtube.com/watch?v={video_id}"
         
-        # 埋め込み形式を標準形式に変換
-        if '/embed/' in url:
-            video_id = url.split('/embed/')[-1].split('?')[0]
-            return f"https://www.youtube.com/watch?v={video_id}"
-        
-        # 標準形式の場合はそのまま返す
+        # 動画IDを抽出できない標準形式の場合はそのまま返す
         if 'youtube.com/watch' in url:
             return url
         
@@ -51,50 +74,13 @@ def generate_title_from_url(url: str) -> str:
         str: 生成されたタイトル
     """
     try:
-        # YouTube URLの形式をチェック
-        if 'youtube.com/watch?v=' in url:
-            video_id = url.split('v=')[1].split('&')[0]
-            return f"YouTube動画 (ID: {video_id})"
-        elif 'youtu.be/' in url:
-            video_id = url.split('youtu.be/')[1].split('?')[0]
-            return f"YouTube動画 (ID: {video_id})"
-        elif '/embed/' in url:
-            video_id = url.split('/embed/')[-1].split('?')[0]
+        video_id = extract_video_id(url)
+        if video_id:
             return f"YouTube動画 (ID: {video_id})"
-        else:
-            return "YouTube動画（タイトル取得不可）"
+        return "YouTube動画（タイトル取得不可）"
     except Exception:
         return "YouTube動画（タイトル取得不可）"
 
-def get_title_from_url(url: str) -> str:
-    """
-    YouTube URLからタイトルを取得する
-    
-    Args:
-        url (str): YouTube URL
-        
-    Returns:
-        str: 取得されたタイトル、失敗時はURLから生成されたタイトル
-    """
-    try:
-        # 統合されたYouTubeDownloaderクラスを使用
-        from .downloader import YouTubeDownloader
-        
-        downloader = YouTubeDownloader()
-        title = downloader.get_video_title(url)
-        
-        if title and title != "YouTube動画（タイトル取得不可）":
-            logger.info(f"Retrieved video title from URL: {title}")
-            return title
-        else:
-            logger.warning("Could not retrieve video title, using fallback")
-            return generate_title_from_url(url)
-            
-    except Exception as e:
-        logger.warning(f"Failed to get video title from URL: {e}")
-        # エラーが発生した場合、URLからビデオIDを抽出してタイトルを生成
-        return generate_title_from_url(url)
-
 def is_playlist_url(url: str) -> bool:
     """
     プレイリストURLかどうかを判定
@@ -105,13 +91,7 @@ def is_playlist_url(url: str) -> bool:
     Returns:
         bool: プレイリストURLかどうか
     """
-    playlist_patterns = [
-        'playlist?list=',
-        '&list=',
-        '/playlist?list='
-    ]
-    
-    return any(pattern in url for pattern in playlist_patterns)
+    return _PLAYLIST_RE.search(url) is not None
 
 def validate_youtube_url(url: str) -> bool:
     """
@@ -123,14 +103,8 @@ def validate_youtube_url(url: str) -> bool:
     Returns:
         bool: 有効なYouTube URLかどうか
     """
-    youtube_patterns = [
-        'https://www.youtube.com/watch',
-        'https://youtube.com/watch',
-        'https://youtu.be/',
-        'https://www.youtube.com/embed/',
-        'https://youtube.com/embed/',
-        'https://www.youtube.com/playlist',
-        'https://youtube.com/playlist'
-    ]
-    
-    return any(url.startswith(pattern) for pattern in youtube_patterns)
+    # 明らかにYouTube以外の入力は正規表現を評価せずに除外
+    # （最短の有効URL "https://youtu.be/" より短い入力も対象）
+    if len(url) < 16 or 'youtu' not in url:
+        return False
+    return _YOUTUBE_URL_RE.match(url) is not None
@@ -5,23 +5,43 @@ YouTube Discord Bot - メインエントリーポイント
 """
 
 import asyncio
+import hashlib
+import json
 import logging
+import os
+import sys
 from pathlib import Path
 
 # エンコーディング設定を最初に実行
 from bot.utils.encoding import setup_encoding
 setup_encoding()
 
+# Windows以外ではuvloopのイベントループを使用（WebSocket・音声UDPのI/O負荷を軽減）
+if sys.platform != 'win32':
+    import uvloop
+    uvloop.install()
+
+import discord
+
 from bot.config.settings import validate_settings, get_settings, DISCORD_TOKEN, DOWNLOAD_DIR
 from bot.config.discord_config import create_bot_instance, setup_bot_activity
 from bot.audio import AudioQueue, AudioPlayer
+from bot.youtube import YouTubeDownloader, shutdown_download_executor
 from bot.commands import setup_music_commands, setup_download_commands, setup_general_commands
-from bot.utils.file_utils import cleanup_old_audio_files, force_kill_ffmpeg_processes
+from bot.utils.file_utils import cleanup_old_audio_files, cleanup_downloads_directory, sweep_expired_downloads
+from bot.utils.audio_cache import enforce_cache_limit
 
 # ログ設定
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# ダウンロードファイルの期限切れ確認間隔（秒）と保持期間（秒）
+JANITOR_INTERVAL = 300
+DOWNLOAD_MAX_AGE = 3600
+
+# 最後に同期したスラッシュコマンド定義のハッシュを保存するファイル
+COMMAND_SIGNATURE_FILE = Path(__file__).parent / '.cmd_sig'
+
 class YouTubeBotMain:
     """メインボットクラス"""
     
@@ -34,8 +54,15 @@ class YouTubeBotMain:
         self.bot = create_bot_instance(self.settings['BOT_PREFIX'])
         
         # 音声関連のインスタンス
-        self.audio_queue = AudioQueue()
-        self.audio_player = AudioPlayer(self.settings['DOWNLOAD_DIR'])
+        self.audio_queue = AudioQueue(self.settings['MAX_QUEUE_SIZE'])
+        self.audio_player = AudioPlayer(self.settings['DOWNLOAD_DIR'], self.settings['PLAYBACK_VOLUME'])
+        
+        # yt-dlpの場所を起動時に一度だけ確認（結果はクラス全体でキャッシュ）
+        if not YouTubeDownloader(self.settings['DOWNLOAD_DIR']).check_yt_dlp():
+            logger.error("yt-dlpが見つからないため、再生・ダウンロード機能は利用できません")
+        
+        # ダウンロードファイルの定期削除タスク
+        self.janitor_task = None
         
         # イベントハンドラーの設定
         self._setup_events()
@@ -46,27 +73,62 @@ class YouTubeBotMain:
     def _setup_events(self):
         """ボットイベントの設定"""
         
+        async def setup_hook():
+            """ログイン後、ゲートウェイ接続前に一度だけ実行される初期化処理"""
+            # ダウンロードディレクトリを作成
+            Path(self.settings['DOWNLOAD_DIR']).mkdir(exist_ok=True)
+            
+            # 古い音声ファイルのクリーンアップ（ファイル走査はスレッドプールで実行）
+            await asyncio.get_running_loop().run_in_executor(
+                None, cleanup_old_audio_files, self.settings['DOWNLOAD_DIR']
+            )
+            
+            # 期限切れダウンロードファイルの定期削除を開始
+            self.janitor_task = asyncio.create_task(self._download_janitor())
+            
+            # スラッシュコマンドを同期
+            await self._sync_commands()
+        
+        # on_readyは再接続のたびに呼ばれるため、一度だけでよい処理はsetup_hookで行う
+        self.bot.setup_hook = setup_hook
+        
         @self.bot.event
         async def on_ready():
             """ボットが起動した時の処理"""
             logger.info(f'{self.bot.user} としてログインしました！')
             logger.info(f'サーバー数: {len(self.bot.guilds)}')
-            
-            # ダウンロードディレクトリを作成
-            Path(self.settings['DOWNLOAD_DIR']).mkdir(exist_ok=True)
-            
-            # 古い音声ファイルのクリーンアップ
-            cleanup_old_audio_files(self.settings['DOWNLOAD_DIR'])
-            
-            # 残っているFFmpegプロセスのクリーンアップ
-            force_kill_ffmpeg_processes()
+            logger.info(f'イベントループ: {type(asyncio.get_running_loop()).__name__}')
             
             # アクティビティを設定
             setup_activity = setup_bot_activity(self.bot)
             await setup_activity()
-            
-            # スラッシュコマンドを同期
-            await self._sync_commands()
+        
+        @self.bot.event
+        async def on_guild_channel_update(before, after):
+            """チャンネル設定の変更時に通知チャンネルの権限確認をやり直す"""
+            self.audio_queue.invalidate_notification_channel(after.guild.id)
+        
+        @self.bot.event
+        async def on_guild_role_update(before, after):
+            """ロール権限の変更時に通知チャンネルの権限確認をやり直す"""
+            self.audio_queue.invalidate_notification_channel(after.guild.id)
+    
+    async def _download_janitor(self):
+        """期限切れのダウンロードファイルと容量超過分の音声キャッシュを定期的に削除する"""
+        cache_max_bytes = self.settings['AUDIO_CACHE_MAX_MB'] * 1024 * 1024
+        while True:
+            await asyncio.sleep(JANITOR_INTERVAL)
+            try:
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, sweep_expired_downloads, DOWNLOAD_MAX_AGE)
+                
+                # 再生中のファイルは削除対象から除外
+                in_use = list(self.audio_player.current_audio_files.values())
+                await loop.run_in_executor(
+                    None, enforce_cache_limit, self.settings['DOWNLOAD_DIR'], cache_max_bytes, in_use
+                )
+            except Exception as e:
+                logger.error(f"Download janitor error: {e}")
     
     def _setup_commands(self):
         """コマンドのセットアップ"""
@@ -89,32 +151,49 @@ class YouTubeBotMain:
         # 一般的なコマンド
         setup_general_commands(self.bot)
     
+    def _command_signature(self) -> str:
+        """登録されているスラッシュコマンド定義のハッシュを計算（ボットのアプリケーションごとに異なる値になる）"""
+        tree = self.bot.tree
+        # トークンを別のアプリケーションに切り替えた場合も同期されるようにアプリケーションIDを含める
+        payload = [self.bot.application_id]
+        for cmd in tree.get_commands():
+            try:
+                payload.append(cmd.to_dict(tree))
+            except TypeError:
+                # discord.py 2.4未満ではto_dictは引数を取らない
+                payload.append(cmd.to_dict())
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+    
     async def _sync_commands(self):
-        """スラッシュコマンドの同期"""
+        """スラッシュコマンドの同期（コマンド定義が変わった場合のみ）"""
         try:
-            logger.info("Syncing slash commands...")
+            # 開発用ギルドが指定されている場合は、そのギルドにも即座に反映
+            dev_guild_id = os.environ.get('DEV_GUILD_ID')
+            if dev_guild_id and not dev_guild_id.strip().isdigit():
+                # 不正な値でもグローバル同期は行う
+                logger.warning(f"DEV_GUILD_ID must be a numeric guild ID, ignoring: {dev_guild_id}")
+            elif dev_guild_id:
+                dev_guild = discord.Object(id=int(dev_guild_id))
+                self.bot.tree.copy_global_to(guild=dev_guild)
+                guild_synced = await self.bot.tree.sync(guild=dev_guild)
+                logger.info(f'✅ Synced {len(guild_synced)} command(s) to dev guild: {dev_guild_id}')
+            
+            # 前回同期時とコマンド定義が同じ場合はグローバル同期を省略
+            signature = self._command_signature()
+            try:
+                previous_signature = COMMAND_SIGNATURE_FILE.read_text(encoding='utf-8').strip()
+            except OSError:
+                previous_signature = None
+            
+            if signature == previous_signature:
+                logger.info("Slash commands unchanged, skipping global sync")
+                return
             
             # グローバルコマンドを同期
             logger.info("Syncing global commands...")
             global_synced = await self.bot.tree.sync()
             logger.info(f'✅ Synced {len(global_synced)} global command(s)')
             
-            # 各ギルドにも個別に同期（即座に反映）
-            logger.info("Syncing guild commands...")
-            for guild in self.bot.guilds:
-                try:
-                    guild_synced = await self.bot.tree.sync(guild=guild)
-                    logger.info(f'✅ Synced {len(guild_synced)} command(s) to guild: {guild.name}')
-                    
-                    # ギルドコマンドの詳細も表示
-                    if guild_synced:
-                        logger.info(f"  Guild commands for {guild.name}:")
-                        for cmd in guild_synced:
-                            logger.info(f"    - /{cmd.name}: {cmd.description}")
-                    
-                except Exception as e:
-                    logger.error(f'❌ Failed to sync to guild {guild.name}: {e}')
-            
             # 登録されたコマンドの詳細をログに出力
             logger.info("Global commands:")
             for cmd in global_synced:
@@ -124,6 +203,9 @@ class YouTubeBotMain:
             if len(global_synced) == 0:
                 logger.warning("⚠️ No global commands were synced. This may indicate a permission issue.")
                 logger.warning("Please check bot permissions and invite URL.")
+            else:
+                # 同期に成功した場合のみ記録（失敗時は次回起動時に再同期）
+                COMMAND_SIGNATURE_FILE.write_text(signature, encoding='utf-8')
                 
         except Exception as e:
             logger.error(f'❌ Failed to sync commands: {e}')
@@ -147,33 +229,19 @@ class YouTubeBotMain:
                 logger.info("アクティブタスクをキャンセル中...")
                 self.audio_queue.cancel_all_tasks()
                 
+                # 実行中のダウンロードの完了を待ってスレッドプールを終了
+                shutdown_download_executor()
+                
                 # ファイルクリーンアップ
-                from bot.utils.file_utils import cleanup_downloads_directory
                 cleanup_stats = cleanup_downloads_directory(self.settings['DOWNLOAD_DIR'])
                 logger.info(f"ファイルクリーンアップ完了: {cleanup_stats}")
                 
-                # 少し待機してタスクの完了を確認
-                import asyncio
-                try:
-                    # 既存のイベントループがある場合は利用
-                    loop = asyncio.get_event_loop()
-                    if loop.is_running():
-                        # すでに実行中の場合は短時間待機
-                        logger.info("タスク完了を待機中...")
-                    else:
-                        # ループが停止している場合は、短時間だけ待機
-                        loop.run_until_complete(asyncio.sleep(0.5))
-                except:
-                    pass
-                    
                 logger.info("クリーンアップ完了")
             except Exception as cleanup_error:
                 logger.warning(f"クリーンアップエラー: {cleanup_error}")
     
     def _handle_startup_errors(self, error):
         """起動エラーの処理"""
-        import discord
-        
         if isinstance(error, discord.LoginFailure):
             print("❌ Discordトークンが無効です。")
         elif isinstance(error, discord.errors.PrivilegedIntentsRequired):